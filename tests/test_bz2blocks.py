@@ -0,0 +1,52 @@
+import bz2
+import random
+
+import pytest
+
+from wikidatasets.bz2blocks import iter_blocks, iter_range_lines, read_line
+
+
+def make_dump(file_name, n_streams=1):
+    """Writes a bz2 file of several blocks (compresslevel=1 gives blocks of 100k bytes) made of `n_streams` \
+    concatenated streams, as pbzip2 writes them, and returns its decompressed content.
+
+    """
+    rng = random.Random(0)
+    lines = [b'[\n']
+    for i in range(12000):
+        words = ' '.join(rng.choice(['alpha', 'beta', 'gamma', 'delta', 'epsilon']) for _ in range(rng.randint(1, 9)))
+        lines.append('{{"id": "Q{}", "text": "{}"}},\n'.format(i, words).encode())
+    lines.append(b']\n')
+    text = b''.join(lines)
+    step = len(text) // n_streams + 1
+    with open(file_name, 'wb') as f:
+        for start in range(0, len(text), step):
+            f.write(bz2.compress(text[start:start + step], compresslevel=1))
+    return text
+
+
+@pytest.mark.parametrize('n_streams', [1, 3])
+def test_range_lines_round_trip(tmp_path, n_streams):
+    file_name = str(tmp_path / 'dump.json.bz2')
+    text = make_dump(file_name, n_streams)
+    with open(file_name, 'rb') as f:
+        assert len(list(iter_blocks(f))) > 3
+    with bz2.open(file_name, 'rb') as f:
+        assert f.read() == text
+
+    for num_workers in [1, 2, 3, 7]:
+        lines = [line for worker in range(num_workers) for _, line in iter_range_lines(file_name, worker, num_workers)]
+        assert b''.join(lines) == text[text.index(b'\n') + 1:]  # the opening "[" is skipped
+
+
+def test_read_line(tmp_path):
+    file_name = str(tmp_path / 'dump.json.bz2')
+    make_dump(file_name, n_streams=2)
+    with open(file_name, 'rb') as f:
+        for worker in range(3):
+            lines = list(iter_range_lines(file_name, worker, 3))
+            # every 97th line and the lines continued in the next block, whose next line starts in another block
+            checked = lines[::97] + [lines[i] for i in range(len(lines) - 1) if lines[i][0][0] != lines[i + 1][0][0]]
+            assert len(checked) > len(lines[::97])
+            for position, line in checked + lines[-1:]:
+                assert read_line(f, position) == line
@@ -6,8 +6,23 @@ __author__ = """Armand Boschin"""
 __email__ = 'aboschin@enst.fr'
 __version__ = '0.3.0'
 
-from .processFunctions import get_subclasses
-from .processFunctions import query_wikidata_dump
-from .processFunctions import build_dataset
+# the functions are imported on first access, so that importing the package (e.g. in worker processes or for the
+# command line interface) does not load pandas
+_LAZY = {'get_subclasses': 'processFunctions',
+         'query_wikidata_dump': 'processFunctions',
+         'build_dataset': 'processFunctions',
+         'load_data_labels': 'utils',
+         'load_stats': 'utils'}
 
-from .utils import load_data_labels
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    import importlib
+    value = getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
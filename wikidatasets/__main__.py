@@ -0,0 +1,5 @@
+import sys
+
+from wikidatasets.cli import main
+
+sys.exit(main())
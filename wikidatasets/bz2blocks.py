@@ -0,0 +1,161 @@
+import bz2
+import os
+
+BLOCK_MAGIC = 0x314159265359  # 48 bits starting each compressed block (BCD of pi)
+EOS_MAGIC = 0x177245385090  # 48 bits ending each stream (BCD of sqrt(pi))
+SCAN_SIZE = 1 << 22  # number of compressed bytes searched for markers at once
+
+
+def scan_markers(data):
+    """Finds the block and end-of-stream markers in `data`. Markers of bz2 files are not aligned on bytes, so \
+    the search is done on the 8 bit shifts of `data`.
+
+    Returns
+    -------
+    markers: list
+        Sorted list of (bit, is_block) where bit is the position of the marker in `data`, in bits.
+    """
+    markers = []
+    value = int.from_bytes(data, 'big')
+    block, eos = BLOCK_MAGIC.to_bytes(6, 'big'), EOS_MAGIC.to_bytes(6, 'big')
+    for shift in range(8):
+        shifted = (value << shift).to_bytes(len(data) + 1, 'big')
+        for magic, is_block in ((block, True), (eos, False)):
+            i = shifted.find(magic)
+            while i != -1:
+                if i > 0:  # the first byte of `shifted` is padding
+                    markers.append((8 * i - 8 + shift, is_block))
+                i = shifted.find(magic, i + 1)
+    return sorted(markers)
+
+
+def iter_blocks(f, start_bit=0):
+    """Yields the (start_bit, end_bit) ranges of the compressed blocks of the bz2 file `f` (opened in binary mode) \
+    starting at or after `start_bit`. A block ends where the next block or the end of its stream starts, so that \
+    files made of several streams (e.g. written by pbzip2) are handled as well.
+
+    """
+    block = None
+    offset = start_bit // 8
+    while True:
+        f.seek(offset)
+        data = f.read(SCAN_SIZE + 6)
+        last = len(data) < SCAN_SIZE + 6
+        for bit, is_block in scan_markers(data):
+            if not last and bit >= 8 * SCAN_SIZE:
+                break  # found again by the next scan
+            bit += 8 * offset
+            if bit < start_bit:
+                continue
+            if block is not None:
+                yield block, bit
+            block = bit if is_block else None
+        if last:
+            break
+        offset += SCAN_SIZE
+    if block is not None:
+        yield block, 8 * (offset + len(data))  # truncated file, decompressing the block fails
+
+
+def read_bits(f, start_bit, end_bit):
+    """Integer made of the bits [start_bit, end_bit) of the file `f`."""
+    start, end = start_bit // 8, (end_bit + 7) // 8
+    f.seek(start)
+    value = int.from_bytes(f.read(end - start), 'big') >> (8 * end - end_bit)
+    return value & ((1 << (end_bit - start_bit)) - 1)
+
+
+def decompress_block(f, start_bit, end_bit):
+    """Decompresses one block of the bz2 file `f`, given its range as yielded by `iter_blocks`. The block is \
+    wrapped into a stream of its own: a header, the block realigned on bytes and an end-of-stream marker carrying \
+    the block checksum (the 32 bits following the block marker) as stream checksum.
+
+    """
+    n_bits = end_bit - start_bit
+    value = read_bits(f, start_bit, end_bit)
+    crc = (value >> (n_bits - 80)) & 0xffffffff
+    value = (value << 80) | (EOS_MAGIC << 32) | crc
+    n_bits += 80
+    padding = -n_bits % 8
+    return bz2.decompress(b'BZh9' + (value << padding).to_bytes((n_bits + padding) // 8, 'big'))
+
+
+def byte_range(dump_path, worker, num_workers):
+    """Range [start_bit, end_bit) of the compressed dump owned by `worker` out of `num_workers`: the blocks \
+    starting in this range are decompressed by this worker.
+
+    """
+    size = os.path.getsize(dump_path)
+    return 8 * (size * worker // num_workers), 8 * (size * (worker + 1) // num_workers)
+
+
+def iter_range_lines(dump_path, worker, num_workers):
+    """Yields the lines of the decompressed dump belonging to `worker` out of `num_workers`, without reading the \
+    rest of the dump. The worker decompresses the blocks starting in its byte range (see `byte_range`) and skips \
+    the text before the first line break, which belongs to the previous worker (or is the opening "[" of the dump \
+    for the first one). The last line is completed with the text of the next blocks, up to the next line break.
+
+    Yields
+    ------
+    position: tuple
+        (block, offset): bit position of the block in which the line starts and byte offset of the line in the \
+        decompressed block.
+    line: bytes
+        The line, with its line break.
+    """
+    start_bit, end_bit = byte_range(dump_path, worker, num_workers)
+    started = False
+    position, pending = None, []
+    with open(dump_path, 'rb') as f:
+        for block, block_end in iter_blocks(f, start_bit):
+            if block >= end_bit and not started:
+                return
+            text = decompress_block(f, block, block_end)
+            if not started:
+                offset = text.find(b'\n') + 1
+                if offset == 0:
+                    continue  # no line starts in this block
+                started = True
+            else:
+                offset = text.find(b'\n') + 1
+                if offset == 0:
+                    pending.append(text)
+                    continue
+                pending.append(text[:offset])
+                yield position, b''.join(pending)
+                if block >= end_bit:
+                    return
+            while True:
+                end = text.find(b'\n', offset) + 1
+                if end == 0:
+                    break
+                yield (block, offset), text[offset:end]
+                offset = end
+            position, pending = (block, offset), [text[offset:]]
+    if started and len(b''.join(pending)) > 0:
+        yield position, b''.join(pending)
+
+
+def format_position(position):
+    """String written in error logs and manifests for a position yielded by `iter_range_lines`."""
+    return '{}+{}'.format(*position)
+
+
+def parse_position(string):
+    block, offset = string.split('+')
+    return int(block), int(offset)
+
+
+def read_line(f, position):
+    """Reads the line of the bz2 file `f` starting at `position` (see `iter_range_lines`)."""
+    block, offset = position
+    pending = []
+    for start_bit, end_bit in iter_blocks(f, block):
+        text = decompress_block(f, start_bit, end_bit)[offset:]
+        offset = 0
+        end = text.find(b'\n') + 1
+        if end > 0:
+            pending.append(text[:end])
+            break
+        pending.append(text)
+    return b''.join(pending)
@@ -0,0 +1,187 @@
+"""Command line interface of WikiDataSets, run with `python -m wikidatasets <command>`.
+
+Commands
+--------
+extract        Go through a Wikidata dump, collecting facts and/or labels.
+merge-labels   Merge labels pickle files into one file.
+subset-labels  Restrict multi-lingual labels to some languages.
+build          Build a dataset from the pickle files of `extract`.
+relabel        Replace the labels of a built dataset by multi-lingual labels.
+
+Heavy dependencies (pandas, the SPARQL client) are only imported by the commands which need them.
+"""
+import argparse
+import os
+import pickle
+import sys
+
+
+def extract(args):
+    from wikidatasets import processFunctions
+
+    if args.merge:
+        complete = processFunctions.merge_range_manifests(args.dump_path, args.path, args.num_workers)
+        return 0 if complete else 1
+
+    test_entities = args.classes
+    if test_entities is not None and args.subclasses:
+        from wikidatasets.sparql import SPARQLClient
+        client = SPARQLClient(cache_dir=args.sparql_cache)
+        subclasses = processFunctions.get_subclasses_many(test_entities, client)
+        test_entities = sorted({id_ for ids in subclasses.values() for id_ in ids})
+    kwargs = {'test_entities': test_entities, 'collect_labels': args.labels, 'multi_lingual': args.multi_lingual,
+              'properties': args.properties, 'exclude_properties': args.exclude_properties,
+              'memory_budget': args.memory_budget, 'profile': args.profile}
+
+    if args.worker is not None:
+        processFunctions.query_wikidata_dump_range(args.dump_path, args.path, args.worker, args.num_workers,
+                                                   n_lines=args.n_lines, **kwargs)
+    elif args.mode == 'serial':
+        processFunctions.query_wikidata_dump(args.dump_path, args.path, args.n_lines, **kwargs)
+    elif args.mode == 'queue':
+        processFunctions.query_wikidata_dump_with_multi_processing(args.dump_path, args.path, args.n_lines,
+                                                                   num_procs=args.procs, **kwargs)
+    else:
+        complete = processFunctions.query_wikidata_dump_with_range_workers(args.dump_path, args.path, args.n_lines,
+                                                                           num_procs=args.procs, **kwargs)
+        return 0 if complete else 1
+    return 0
+
+
+def merge_labels(args):
+    from wikidatasets.utils import load_labels, write_labels_json
+
+    labels = load_labels(args.input)
+    if args.json:
+        write_labels_json(args.output, labels)
+    else:
+        with open(args.output, 'wb') as f:
+            pickle.dump(labels, f)
+    print('Merged {} labels into {}.'.format(len(labels), args.output))
+    return 0
+
+
+def subset_labels(args):
+    from wikidatasets.utils import load_labels, subset_labels, Manifest
+
+    if not os.path.isdir(args.input):
+        with open(args.output, 'wb') as f:
+            pickle.dump(subset_labels(load_labels(args.input), args.langs), f)
+        return 0
+
+    # one labels shard at a time, so that all the labels are never in memory at once
+    path = args.input if args.input[-1] == '/' else args.input + '/'
+    if os.path.exists(path + Manifest.file_name):
+        files = Manifest.load(path).files('labels')
+    else:
+        files = [path + name for name in sorted(os.listdir(path))
+                 if name.startswith('labels') and name.endswith('.pkl')]
+    os.makedirs(args.output, exist_ok=True)
+    for file in files:
+        name = os.path.basename(file)
+        with open(os.path.join(args.output, name), 'wb') as f:
+            pickle.dump(subset_labels(load_labels(file), args.langs), f)
+        print('Subset {}.'.format(name))
+    return 0
+
+
+def build(args):
+    from wikidatasets.processFunctions import build_dataset
+    from wikidatasets.utils import load_labels
+
+    path = args.path if args.path[-1] == '/' else args.path + '/'
+    labels = load_labels(args.labels if args.labels is not None else path + 'pickles/')
+    build_dataset(path, labels, dump_date=args.dump_date, multi_lingual=args.multi_lingual, num_procs=args.procs,
+                  compression=args.compression, verify=args.verify)
+    return 0
+
+
+def relabel(args):
+    import pandas as pd
+    from wikidatasets.utils import load_labels, build_label_store, relabel_frame, write_ent_dict, write_rel_dict
+    from wikidatasets.utils import COMPRESSION_SUFFIXES
+
+    path = args.path if args.path[-1] == '/' else args.path + '/'
+    labels = load_labels(args.labels)
+    if not any(isinstance(label, dict) for label in labels.values()):
+        print('The labels of {} are not multi-lingual, collect them with extract --multi-lingual.'.format(
+            args.labels), file=sys.stderr)
+        return 1
+    suffix = COMPRESSION_SUFFIXES[args.compression]
+    for name, write in [('entities.tsv', write_ent_dict), ('nodes.tsv', write_ent_dict),
+                        ('relations.tsv', write_rel_dict)]:
+        df = pd.read_csv(path + name + suffix, sep='\t', keep_default_na=False, na_values=[''])
+        store = build_label_store(labels, ids=df['wikidataID'].tolist(), languages=args.langs)
+        df = relabel_frame(df.drop(columns=[column for column in df.columns if column.endswith('label')]), store)
+        write(df, path + name, compression=args.compression)
+        print('Relabelled {}.'.format(name + suffix))
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='wikidatasets', description='Build datasets from Wikidata dumps.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('extract', help='go through a Wikidata dump, collecting facts and/or labels')
+    p.add_argument('dump_path', help='path to the latest-all.json.bz2 dump')
+    p.add_argument('path', help='directory where the pickles/ directory is written')
+    p.add_argument('--classes', nargs='+', help='collect the facts of the instances of these classes (e.g. Q5)')
+    p.add_argument('--subclasses', action='store_true', help='also collect the instances of their subclasses, '
+                                                             'queried on the Wikidata SPARQL endpoint')
+    p.add_argument('--sparql-cache', help='cache directory of the SPARQL queries')
+    p.add_argument('--labels', action='store_true', help='collect the labels')
+    p.add_argument('--multi-lingual', action='store_true', help='collect the labels in all languages')
+    p.add_argument('--properties', nargs='+', help='only collect the facts of these relations')
+    p.add_argument('--exclude-properties', nargs='+', help='do not collect the facts of these relations')
+    p.add_argument('--n-lines', type=int, help='number of lines of the dump, for the progress bar')
+    p.add_argument('--mode', choices=['serial', 'queue', 'range'], default='serial',
+                   help='single process, one reader feeding --procs consumers, or --procs independent range workers')
+    p.add_argument('--procs', type=int, default=4, help='number of processes of the queue and range modes')
+    p.add_argument('--worker', type=int, help='only run this range worker (e.g. on one of several machines)')
+    p.add_argument('--num-workers', type=int, help='total number of range workers, with --worker or --merge')
+    p.add_argument('--merge', action='store_true', help='merge the manifests of the --num-workers range workers')
+    p.add_argument('--memory-budget', type=int, help='bytes of facts and labels buffered before pickling')
+    p.add_argument('--profile', action='store_true', help='profile the workers, report in <path>/profile/')
+    p.set_defaults(func=extract)
+
+    p = commands.add_parser('merge-labels', help='merge labels pickle files into one file')
+    p.add_argument('input', help='labels pickle file or directory (e.g. <path>/pickles/)')
+    p.add_argument('output', help='output file')
+    p.add_argument('--json', action='store_true', help='write json lines {"id": ..., "labels": ...}')
+    p.set_defaults(func=merge_labels)
+
+    p = commands.add_parser('subset-labels', help='restrict multi-lingual labels to some languages')
+    p.add_argument('input', help='labels pickle file, or directory whose labels files are processed one by one')
+    p.add_argument('output', help='output file, or directory if input is a directory')
+    p.add_argument('--langs', nargs='+', required=True, help='languages to keep (e.g. en fr zh-hans)')
+    p.set_defaults(func=subset_labels)
+
+    p = commands.add_parser('build', help='build a dataset from the pickle files of extract')
+    p.add_argument('path', help='directory containing the pickles/ directory')
+    p.add_argument('--labels', help='labels pickle file or directory (default: the labels of <path>/pickles/)')
+    p.add_argument('--dump-date', default='23rd April 2019', help='date of the dump, written in the readme')
+    p.add_argument('--multi-lingual', nargs='+', help='write one label column for each of these languages')
+    p.add_argument('--procs', type=int, help='number of processes loading the pickle files and writing the dataset')
+    p.add_argument('--compression', choices=['gzip', 'zstd'], help='compress the .tsv files')
+    p.add_argument('--verify', action='store_true', help='verify the checksums of the pickle files')
+    p.set_defaults(func=build)
+
+    p = commands.add_parser('relabel', help='replace the labels of a built dataset by multi-lingual labels')
+    p.add_argument('path', help='directory of the dataset')
+    p.add_argument('--labels', required=True, help='multi-lingual labels pickle file or directory')
+    p.add_argument('--langs', nargs='+', required=True, help='languages of the label columns (e.g. en zh-hans)')
+    p.add_argument('--compression', choices=['gzip', 'zstd'], help='compression of the dataset')
+    p.set_defaults(func=relabel)
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'extract' and (args.worker is not None or args.merge) and args.num_workers is None:
+        parser.error('--num-workers is required with --worker and --merge')
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os
+import pickle
+
+from wikidatasets.utils import clean, concat_claims, Manifest
+
+
+def snak_value(snak):
+    """Flatten the value of a snak.
+
+    Parameters
+    ----------
+    snak: dict
+        Snak (main snak, qualifier or reference snak) of the dump with snaktype 'value'.
+
+    Returns
+    -------
+    value: str
+        Value of the snak: Wikidata ID for items, amount for quantities, time for dates, 'latitude,longitude' for \
+        coordinates, text for monolingual texts and the string itself otherwise.
+    extra: str
+        Complement of the value: unit for quantities ('1' if unitless), precision for dates, globe for coordinates, \
+        language for monolingual texts and None otherwise.
+    """
+    datavalue = snak['datavalue']
+    value = datavalue['value']
+    type_ = datavalue['type']
+    if type_ == 'wikibase-entityid':
+        if 'id' in value:
+            return value['id'], None
+        return 'Q{}'.format(value['numeric-id']), None
+    if type_ == 'quantity':
+        unit = value['unit']
+        return value['amount'], clean(unit) if unit != '1' else unit
+    if type_ == 'time':
+        return value['time'], str(value['precision'])
+    if type_ == 'globecoordinate':
+        globe = value.get('globe')
+        return '{},{}'.format(value['latitude'], value['longitude']), clean(globe) if globe else None
+    if type_ == 'monolingualtext':
+        return value['text'], value['language']
+    return str(value), None
+
+
+def iter_snaks(snaks):
+    """Iterate through the snaks with a value of a dict {property: [snaks]} (qualifiers or reference snaks)."""
+    for prop_snaks in snaks.values():
+        for snak in prop_snaks:
+            if snak['snaktype'] == 'value':
+                yield snak
+
+
+class Collector:
+    """Base class of the extra extractors run in the dump loops of `query_wikidata_dump`.
+
+    Each collector is called on every parsed entity kept by the loop (the instances of `test_entities` if facts \
+    are collected, all entities otherwise) and buffers its rows column-wise. Buffers are pickled next to the facts \
+    as `{name}_dump{n}.pkl` files containing a dictionary {column: list} each time the loop flushes.
+
+    Subclasses define `name`, `columns` and `collect`.
+    """
+    name = None
+    columns = ()
+
+    def __init__(self):
+        self.data = None
+        self.reset()
+
+    def reset(self):
+        self.data = {column: [] for column in self.columns}
+
+    def __len__(self):
+        return len(self.data[self.columns[0]])
+
+    def append(self, *row):
+        for column, value in zip(self.columns, row):
+            self.data[column].append(value)
+
+    def collect(self, ent):
+        """Buffer the rows of `ent`, the dictionary coming from the parsing of a json line of the dump."""
+        raise NotImplementedError
+
+    def flush(self, pickle_path, suffix, manifest=None, **shard):
+        """Pickle the buffered rows, record the file in `manifest` if given (with the `shard` information) and empty \
+        the buffers.
+
+        """
+        file_name = '{}_dump{}.pkl'.format(self.name, suffix)
+        with open(pickle_path + file_name, 'wb') as f:
+            pickle.dump(self.data, f)
+        if manifest is not None:
+            manifest.add(file_name, self.name, len(self), **shard)
+        self.reset()
+
+
+class LiteralCollector(Collector):
+    """Collects the claims of entities whose value is not an item: dates, quantities, strings, coordinates, \
+    monolingual texts, external IDs...
+
+    Parameters
+    ----------
+    datatypes: list
+        Datatypes of the properties to keep (e.g. ['time', 'quantity']). All datatypes except 'wikibase-item' are \
+        kept by default.
+    properties: list
+        If given, only claims of these properties are kept.
+    """
+    name = 'literals'
+    columns = ('headEntity', 'relation', 'datatype', 'value', 'extra')
+
+    def __init__(self, datatypes=None, properties=None):
+        self.datatypes = None if datatypes is None else set(datatypes)
+        self.properties = None if properties is None else set(properties)
+        super().__init__()
+
+    def collect(self, ent):
+        e1 = ent['id']
+        for claim in concat_claims(ent['claims']):
+            mainsnak = claim['mainsnak']
+            if mainsnak['snaktype'] != 'value':
+                continue
+            datatype = mainsnak['datatype']
+            if datatype == 'wikibase-item' or (self.datatypes is not None and datatype not in self.datatypes):
+                continue
+            rel = mainsnak['property']
+            if self.properties is not None and rel not in self.properties:
+                continue
+            value, extra = snak_value(mainsnak)
+            self.append(e1, rel, datatype, value, extra)
+
+
+class QualifierCollector(Collector):
+    """Collects the qualifiers of the item-valued claims, turning each qualified statement into a hyper-edge. There \
+    is one row per qualifier, the statement being identified by its Wikidata statement ID.
+
+    Parameters
+    ----------
+    properties: list
+        If given, only the statements of these properties are kept.
+    """
+    name = 'qualifiers'
+    columns = ('statementID', 'headEntity', 'relation', 'tailEntity',
+               'qualifier', 'datatype', 'value', 'extra')
+
+    def __init__(self, properties=None):
+        self.properties = None if properties is None else set(properties)
+        super().__init__()
+
+    def collect(self, ent):
+        e1 = ent['id']
+        for claim in concat_claims(ent['claims']):
+            if 'qualifiers' not in claim:
+                continue
+            mainsnak = claim['mainsnak']
+            if mainsnak['snaktype'] != 'value' or mainsnak['datatype'] != 'wikibase-item':
+                continue
+            rel = mainsnak['property']
+            if self.properties is not None and rel not in self.properties:
+                continue
+            e2, _ = snak_value(mainsnak)
+            for snak in iter_snaks(claim['qualifiers']):
+                value, extra = snak_value(snak)
+                self.append(claim['id'], e1, rel, e2, snak['property'], snak['datatype'], value, extra)
+
+
+class ReferenceCollector(Collector):
+    """Collects the references of the item-valued claims. There is one row per reference snak, the statement being \
+    identified by its Wikidata statement ID and the reference by its hash.
+
+    Parameters
+    ----------
+    properties: list
+        If given, only the statements of these properties are kept.
+    """
+    name = 'references'
+    columns = ('statementID', 'headEntity', 'relation', 'tailEntity',
+               'referenceHash', 'referenceProperty', 'datatype', 'value', 'extra')
+
+    def __init__(self, properties=None):
+        self.properties = None if properties is None else set(properties)
+        super().__init__()
+
+    def collect(self, ent):
+        e1 = ent['id']
+        for claim in concat_claims(ent['claims']):
+            if 'references' not in claim:
+                continue
+            mainsnak = claim['mainsnak']
+            if mainsnak['snaktype'] != 'value' or mainsnak['datatype'] != 'wikibase-item':
+                continue
+            rel = mainsnak['property']
+            if self.properties is not None and rel not in self.properties:
+                continue
+            e2, _ = snak_value(mainsnak)
+            for reference in claim['references']:
+                for snak in iter_snaks(reference['snaks']):
+                    value, extra = snak_value(snak)
+                    self.append(claim['id'], e1, rel, e2, reference['hash'], snak['property'], snak['datatype'],
+                                value, extra)
+
+
+def load_collected(path, name):
+    """Concatenates the pickle files written by the collector `name` (e.g. 'literals') into one DataFrame.
+
+    Parameters
+    ----------
+    path: str
+        Path given to `query_wikidata_dump`, containing the pickles/ directory.
+    name: str
+        Name of the collector.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+        DataFrame with one column per column of the collector, empty if the collector wrote no pickle file. A \
+        ValueError is raised if `name` is not the name of a collector and no pickle file was written under it.
+    """
+    import pandas as pd
+    if path[-1] != '/':
+        path = path + '/'
+    path_pickle = path + 'pickles/'
+    if os.path.exists(path_pickle + Manifest.file_name):
+        files = Manifest.load(path_pickle).files(name)
+    else:
+        files = [path_pickle + file for file in sorted(os.listdir(path_pickle))
+                 if file.startswith(name + '_dump') and file.endswith('.pkl')]
+    if len(files) == 0:
+        collectors = [c for c in iter_collector_classes() if c.name == name]
+        if len(collectors) == 0:
+            raise ValueError('No pickle files of a collector named {} in {}.'.format(name, path_pickle))
+        return pd.DataFrame({column: [] for column in collectors[0].columns})
+    frames = []
+    for file in files:
+        with open(file, 'rb') as f:
+            frames.append(pd.DataFrame(pickle.load(f)))
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def iter_collector_classes(cls=Collector):
+    """Subclasses of `cls`, including the collectors defined outside of this module."""
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from iter_collector_classes(subclass)
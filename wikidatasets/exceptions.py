@@ -1,3 +1,6 @@
-
 class ParsingException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class ManifestException(Exception):
+    pass
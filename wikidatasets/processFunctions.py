@@ -1,22 +1,34 @@
 import bz2
-import pickle
 import os
-import pandas as pd
 
-from tqdm import tqdm
+from types import SimpleNamespace
+
 from wikidatasets.utils import get_results, clean
-from wikidatasets.utils import get_pickle_path, write_to_pickle
-from wikidatasets.utils import get_id, get_label, to_triplets, intersect, to_json, get_multiligual_labels
-from wikidatasets.utils import concatpkls, write_csv, write_ent_dict, write_rel_dict, write_readme, relabel, multi_lingual_relabel
+from wikidatasets.utils import get_pickle_path, write_to_pickle, write_labels_to_pickle, Manifest, get_fact_files
+from wikidatasets.utils import get_id, get_label, to_triplets, intersect, to_json, get_multiligual_labels, to_set
+from wikidatasets.utils import peek_id, EntityBitmap, COMPRESSION_SUFFIXES
+from wikidatasets.utils import ErrorLog, read_error_logs, iter_failed_lines, sizeof_facts, sizeof_label, FactBuffer
+from wikidatasets.utils import concatpkls, concatpkls_parallel, factorize_facts, split_core_attributes
+from wikidatasets.utils import write_csv, write_ent_dict, write_rel_dict, write_readme, build_label_store, relabel_frame
+from wikidatasets.utils import write_facts_parallel
+from wikidatasets.utils import DumpStats, write_stats_to_pickle, load_dump_stats, dataset_stats, write_stats
+from wikidatasets.bz2blocks import iter_range_lines, format_position
+from wikidatasets.profiling import start_profiler, save_profile, timed, write_profile_report, clear_profiles
+
+
+def subclasses_query(subject):
+    return """SELECT ?item WHERE {?item wdt:P279* wd:""" + subject + """ .}"""
 
 
-def get_subclasses(subject):
+def get_subclasses(subject, client=None):
     """Get a list of WikiData IDs of entities which are subclasses of the subject.
 
     Parameters
     ----------
     subject: str
         String describing the subject (e.g. 'Q5' for human).
+    client: wikidatasets.sparql.SPARQLClient
+        If given, the query is sent through this client (and its cache).
 
     Returns
     -------
@@ -24,17 +36,54 @@ def get_subclasses(subject):
         List of WikiData IDs of entities which are subclasses of the subject.
 
     """
-    endpoint_url = "https://query.wikidata.org/sparql"
-    query = """SELECT ?item WHERE {?item wdt:P279* wd:""" + subject + """ .}"""
+    if client is not None:
+        return get_subclasses_many([subject], client)[subject]
 
-    results = get_results(endpoint_url, query)
+    endpoint_url = "https://query.wikidata.org/sparql"
+    results = get_results(endpoint_url, subclasses_query(subject))
 
     return [clean(result['item']['value']) for result in results['results']['bindings']]
 
 
-def query_wikidata_dump(dump_path, path, n_lines, test_entities=None, collect_labels=False, multi_lingual=False, skip_lines=None):
+def get_subclasses_many(subjects, client=None):
+    """Get the subclasses of several subjects, querying the endpoint concurrently.
+
+    Parameters
+    ----------
+    subjects: list
+        List of WikiData IDs (e.g. ['Q5', 'Q11424']).
+    client: wikidatasets.sparql.SPARQLClient
+        Client used to send the queries. By default a client without cache is used on the Wikidata endpoint.
+
+    Returns
+    -------
+    result: dict
+        Dictionary mapping each subject to the list of WikiData IDs of its subclasses.
+
+    """
+    from wikidatasets.sparql import SPARQLClient
+    if client is None:
+        client = SPARQLClient()
+    results = client.query_many([subclasses_query(subject) for subject in subjects])
+    return {subject: [clean(result['item']['value']) for result in res['results']['bindings']]
+            for subject, res in zip(subjects, results)}
+
+
+def hot_path(profiler=None):
+    """Functions called on each line by the dump loops, timed by `profiler` (see `wikidatasets.profiling.timed`) \
+    if given.
+
+    """
+    return SimpleNamespace(**{func.__name__: timed(profiler, func) for func in
+                              (to_json, get_id, get_label, get_multiligual_labels, to_triplets, intersect)})
+
+
+def query_wikidata_dump(dump_path, path, n_lines, test_entities=None, collect_labels=False, multi_lingual=False, skip_lines=None,
+                        collectors=None, properties=None, exclude_properties=None, tail_entities=None,
+                        memory_budget=None, profile=False):
     """This function goes through a Wikidata dump. It can either collect entities that are instances of \
-    `test_entities` or collect the dictionary of labels. It can also do both.
+    `test_entities` or collect the dictionary of labels. It can also do both. Counters of the collected facts \
+    (`wikidatasets.utils.DumpStats`) are pickled along with them.
 
     Parameters
     ----------
@@ -54,27 +103,58 @@ def query_wikidata_dump(dump_path, path, n_lines, test_entities=None, collect_la
         whether or not to collect multi-lingual labels for each node.
     skip_lines: int
         This is useful when resuming parsing, will skip the first skip_lines lines.
+    collectors: list
+        List of `wikidatasets.collectors.Collector` instances (e.g. LiteralCollector, QualifierCollector) run on \
+        each kept entity during the same parse. Their outputs are pickled as {name}_dump{n}.pkl files.
+    properties: list
+        Allow-list of relations (e.g. ['P17', 'P27']). If given, only the facts of these relations are collected.
+    exclude_properties: list
+        Deny-list of relations whose facts are not collected.
+    tail_entities: set
+        If given, only the facts whose tail entity is in this set are collected. This is the way to filter on the \
+        class of the tail entity, e.g. with the nodes of another dataset or the instances of a class.
+    memory_budget: int
+        If given, buffered facts and labels are pickled each time their approximate size reaches this number of \
+        bytes, instead of every 3,000,000 lines.
+    profile: bool or float
+        If True (or a sampling interval in seconds), the functions called on each line are timed and the stack is \
+        sampled. The report is written in the profile/ directory of `path` (see \
+        `wikidatasets.profiling.write_profile_report`).
 
     """
+    from tqdm import tqdm
     pickle_path = get_pickle_path(path)
     collect_facts = (test_entities is not None)
-    fails = []
+    collectors = [] if collectors is None else collectors
+    properties, exclude_properties, tail_entities = map(to_set, (properties, exclude_properties, tail_entities))
+    errors = ErrorLog(pickle_path + 'fails.tsv')
+    manifest = Manifest(pickle_path)
+    if profile:
+        clear_profiles(path)
+    profiler = start_profiler(profile)
+    hot = hot_path(profiler)
 
     n_pickle_dump = 0
     if collect_labels:
         labels = {}
     if collect_facts:
-        facts = []
+        facts = FactBuffer()
+        stats = DumpStats()
 
     ids = set()
-    dump = bz2.open(dump_path, 'rt')
+    buffered = 0  # approximate number of bytes of the buffered facts and labels
+    dump = bz2.open(dump_path, 'rb')
     progress_bar = tqdm(total=n_lines)
     counter = 0  # counter of the number of lines read
-    line = dump.readline()  # the first line of the file should be "[\n" so we skip it
+    offset = len(dump.readline())  # the first line of the file should be "[\n" so we skip it
+    first_offset = offset  # offset of the first line of the current shard
 
     while True:
         # while there are lines to read
-        line = dump.readline().strip()
+        line = dump.readline()
+        line_offset = offset
+        offset += len(line)
+        line = line.decode('utf-8').strip()
         if len(line) == 0:
             break
 
@@ -85,47 +165,68 @@ def query_wikidata_dump(dump_path, path, n_lines, test_entities=None, collect_la
         progress_bar.update(1)
 
         try:
-            line = to_json(line)
+            line = hot.to_json(line)
 
             if collect_labels:
-                id_ = get_id(line)
+                id_ = hot.get_id(line)
                 if id_ in ids:
                     continue
                 ids.add(id_)
                 if multi_lingual:
-                    labels[id_] = get_multiligual_labels(line)
+                    labels[id_] = hot.get_multiligual_labels(line)
                 else:
-                    labels[id_] = get_label(line)
+                    labels[id_] = hot.get_label(line)
+                buffered += sizeof_label(id_, labels[id_])
 
+            keep = True
             if collect_facts:
-                triplets, instanceOf = to_triplets(line)
-                if len(instanceOf) > 0 and intersect(instanceOf, test_entities):
+                triplets, instanceOf = hot.to_triplets(line, properties, exclude_properties, tail_entities)
+                keep = len(instanceOf) > 0 and hot.intersect(instanceOf, test_entities)
+                if keep:
                     facts.extend(triplets)
+                    stats.add(triplets, instanceOf)
+                    buffered += sizeof_facts(triplets)
+            if keep:
+                for collector in collectors:
+                    collector.collect(line)
 
-        except:
-            if type(line) == dict and ('claims' in line.keys()):
-                if len(line['claims']) != 0:
-                    fails.append(line)
-            else:
-                fails.append(line)
+        except Exception as e:
+            errors.record(line_offset, line, e)
 
-        if counter % 3000000 == 0:
+        if (counter % 3000000 == 0) if memory_budget is None else (buffered >= memory_budget):
             # dump in pickle to free memory
             n_pickle_dump += 1
+            buffered = 0
+            errors.flush()
+            shard = {'index': n_pickle_dump, 'first_offset': first_offset, 'end_offset': offset}
             if collect_facts:
-                facts, fails = write_to_pickle(pickle_path, facts, fails, n_pickle_dump)
+                facts = write_to_pickle(pickle_path, facts, n_pickle_dump, manifest, **shard)
+                stats = write_stats_to_pickle(pickle_path, stats, n_pickle_dump, manifest, **shard)
             if collect_labels:
-                pickle.dump(labels, open(pickle_path+f'labels_dump{n_pickle_dump}.pkl', 'wb'))
-                print(f'Pickle Labels Number {n_pickle_dump}')
-                labels={}
+                labels = write_labels_to_pickle(pickle_path, labels, n_pickle_dump, manifest, **shard)
+            for collector in collectors:
+                collector.flush(pickle_path, n_pickle_dump, manifest, **shard)
+            first_offset = offset
 
     n_pickle_dump +=1
+    errors.close()
+    shard = {'index': n_pickle_dump, 'first_offset': first_offset, 'end_offset': offset}
     if collect_facts:
-        _, _ = write_to_pickle(pickle_path, facts, fails, n_pickle_dump)
+        _ = write_to_pickle(pickle_path, facts, n_pickle_dump, manifest, **shard)
+        _ = write_stats_to_pickle(pickle_path, stats, n_pickle_dump, manifest, **shard)
     if collect_labels:
-        pickle.dump(labels, open(pickle_path + f'labels_dump{n_pickle_dump}.pkl', 'wb'))
+        _ = write_labels_to_pickle(pickle_path, labels, n_pickle_dump, manifest, **shard)
+    for collector in collectors:
+        collector.flush(pickle_path, n_pickle_dump, manifest, **shard)
+    manifest.save('query', dump_path, num_procs=1, complete=True)
+    if profiler is not None:
+        save_profile(profiler, path, 'main')
+        write_profile_report(path)
         
-def query_wikidata_dump_with_multi_processing(dump_path, path, n_lines, test_entities=None, collect_labels=False, multi_lingual=False, skip_lines=None, num_procs=4, size_of_queue=50000, memory_lines=3000000, skip_bytes=None):
+def query_wikidata_dump_with_multi_processing(dump_path, path, n_lines, test_entities=None, collect_labels=False, multi_lingual=False, skip_lines=None, num_procs=4, size_of_queue=50000, memory_lines=3000000, skip_bytes=None,
+                                              batch_size=1000, collectors=None, properties=None, exclude_properties=None,
+                                              tail_entities=None, memory_budget=None, profile=False,
+                                              profile_workers=None):
     """This function goes through a Wikidata dump. It can either collect entities that are instances of \
     `test_entities` or collect the dictionary of labels. It can also do both.
     
@@ -149,36 +250,88 @@ def query_wikidata_dump_with_multi_processing(dump_path, path, n_lines, test_ent
         whether or not to collect multi-lingual labels for each node.
     skip_lines: int
         This is useful when resuming parsing, will skip the first skip_lines lines.
+    collectors: list
+        List of `wikidatasets.collectors.Collector` instances (e.g. LiteralCollector, QualifierCollector) run on \
+        each kept entity during the same parse. Their outputs are pickled as {name}_dump{n}.pkl files.
+    properties: list
+        Allow-list of relations (e.g. ['P17', 'P27']). If given, only the facts of these relations are collected.
+    exclude_properties: list
+        Deny-list of relations whose facts are not collected.
+    tail_entities: set
+        If given, only the facts whose tail entity is in this set are collected. This is the way to filter on the \
+        class of the tail entity, e.g. with the nodes of another dataset or the instances of a class.
     num_procs: int
         number of consumers processes.
+    size_of_queue: int
+        Maximum number of lines waiting to be processed.
+    batch_size: int
+        Number of lines sent at once to a consumer. Batches are dealt to the consumers in turn, so that the content \
+        of each shard only depends on the dump and the parameters.
+    memory_lines: int
+        Total number of lines buffered by the consumers before pickling (each consumer pickles every \
+        memory_lines/num_procs lines).
+    memory_budget: int
+        If given, replaces `memory_lines`: total number of bytes of facts and labels buffered by the consumers, each \
+        consumer pickling its buffers when their approximate size reaches memory_budget/num_procs bytes.
+    profile: bool or float
+        If True (or a sampling interval in seconds), the functions called on each line are timed in the consumers and the stack is \
+        sampled. The report is written in the profile/ directory of `path` (see \
+        `wikidatasets.profiling.write_profile_report`).
+    profile_workers: list
+        Indices of the consumers to profile, all of them by default.
+
+    Shards are named after their consumer and index (e.g. dump_w003_00012.pkl) and listed in pickles/manifest.json \
+    with their dump range, number of rows, size and checksum.
 
     """
-    from multiprocessing import Process, Queue
+    import queue
+    from multiprocessing import Array, Process, Queue
+    from tqdm import tqdm
     
     pickle_path = get_pickle_path(path)
     collect_facts = (test_entities is not None)
+    collectors = [] if collectors is None else collectors
+    properties, exclude_properties, tail_entities = map(to_set, (properties, exclude_properties, tail_entities))
     save_steps = int(memory_lines/num_procs)
-    q=Queue(size_of_queue)
+    worker_budget = None if memory_budget is None else memory_budget // num_procs
+    queues = [Queue(max(2, size_of_queue // (batch_size * num_procs))) for _ in range(num_procs)]
+    results = Queue()
+    failed = Array('b', num_procs)  # set by the parent for the consumers which died
     ids = set()
+    if profile:
+        clear_profiles(path)
+
+    def put(worker, item):
+        """Put `item` in the queue of `worker`, giving up if it died. Returns whether the item was put."""
+        while True:
+            try:
+                queues[worker].put(item, timeout=1)
+                return True
+            except queue.Full:
+                if failed[worker]:
+                    return False
 
     def producer_func(num_worker):
-        dump = bz2.open(dump_path, 'rt')
+        dump = bz2.open(dump_path, 'rb')
+        offset = 0
         if skip_bytes is not None:
             dump.seek(skip_bytes)
-            dump.readline()
+            offset = skip_bytes + len(dump.readline())
             print(f'Skip {skip_bytes} Bytes.')
         
         progress_bar = tqdm(total=n_lines)
         counter = 0  # counter of the number of lines read
-        line = dump.readline()  # the first line of the file should be "[\n" so we skip it
+        offset += len(dump.readline())  # the first line of the file should be "[\n" so we skip it
         counter=0
+        batch = []
+        n_batch = 0
 
         while True:
             # while there are lines to read
-            line = dump.readline().strip()
-            if len(line) == 0:
-                for i in range(num_worker):
-                    q.put('STOP')
+            line = dump.readline()
+            line_offset = offset
+            offset += len(line)
+            if len(line.strip()) == 0:
                 break
 
             counter += 1
@@ -188,77 +341,116 @@ def query_wikidata_dump_with_multi_processing(dump_path, path, n_lines, test_ent
                 if counter < skip_lines+1:
                     continue
             
-            q.put(line)
-
-    def consumer_func():
-        process_id = os.getpid()
-        print('process id:', process_id)
-        fails = []
+            batch.append((line_offset, line))
+            if len(batch) == batch_size:
+                if not put(n_batch % num_worker, batch):
+                    return  # the run is incomplete anyway
+                batch = []
+                n_batch += 1
+
+        if len(batch) > 0:
+            put(n_batch % num_worker, batch)
+        for worker in range(num_worker):
+            put(worker, None)
+
+    def consumer_func(worker):
+        print(f'worker {worker}, process id: {os.getpid()}')
+        q = queues[worker]
+        errors = ErrorLog(pickle_path + 'fails_w{:03d}.tsv'.format(worker))
+        manifest = Manifest(pickle_path)
+        profiler = start_profiler(profile if profile_workers is None or worker in profile_workers else False)
+        hot = hot_path(profiler)
 
         if collect_labels:
             labels = {}
         if collect_facts:
-            facts = []
+            facts = FactBuffer()
+            stats = DumpStats()
             
         n_pickle_dump = 0
         counter=0
+        buffered = 0  # approximate number of bytes of the buffered facts and labels
+        first_offset, end_offset = None, None  # dump range of the current shard
         
         while True:
             try:
-                line=q.get()
+                batch=q.get()
             except:
-                print(f'Process num {process_id} Error!')
+                print(f'Worker {worker} Error!')
                 break
                 
-            counter+=1
-            if line == 'STOP':
+            if batch is None:
                 break
-        
-            try:
-                line = to_json(line)
-
-                if collect_labels:
-                    id_ = get_id(line)
-                    if id_ in ids:
-                        continue
-                    ids.add(id_)
-                    if multi_lingual:
-                        labels[id_] = get_multiligual_labels(line)
-                    else:
-                        labels[id_] = get_label(line)
-
-                if collect_facts:
-                    triplets, instanceOf = to_triplets(line)
-                    if len(instanceOf) > 0 and intersect(instanceOf, test_entities):
-                        facts.extend(triplets)
 
-            except:
-                if type(line) == dict and ('claims' in line.keys()):
-                    if len(line['claims']) != 0:
-                        fails.append(line)
-                else:
-                    fails.append(line)
-
-            if counter % save_steps == 0:
-                # dump in pickle to free memory
-                n_pickle_dump += 1
-                suffix = '_' + str(process_id) + '_' + str(n_pickle_dump)
-                if collect_facts:
-                    facts, fails = write_to_pickle(pickle_path, facts, fails, suffix)
-                if collect_labels:
-                    pickle.dump(labels, open(pickle_path+f'labels_dump{suffix}.pkl', 'wb'))
-                    print(f'Pickle Labels Number {suffix}')
-                    labels={}
+            for line_offset, line in batch:
+                counter+=1
+                if first_offset is None:
+                    first_offset = line_offset
+                end_offset = line_offset + len(line)
+                line = line.decode('utf-8').strip()
+            
+                try:
+                    line = hot.to_json(line)
+
+                    if collect_labels:
+                        id_ = hot.get_id(line)
+                        if id_ in ids:
+                            continue
+                        ids.add(id_)
+                        if multi_lingual:
+                            labels[id_] = hot.get_multiligual_labels(line)
+                        else:
+                            labels[id_] = hot.get_label(line)
+                        buffered += sizeof_label(id_, labels[id_])
+
+                    keep = True
+                    if collect_facts:
+                        triplets, instanceOf = hot.to_triplets(line, properties, exclude_properties, tail_entities)
+                        keep = len(instanceOf) > 0 and hot.intersect(instanceOf, test_entities)
+                        if keep:
+                            facts.extend(triplets)
+                            stats.add(triplets, instanceOf)
+                            buffered += sizeof_facts(triplets)
+                    if keep:
+                        for collector in collectors:
+                            collector.collect(line)
+
+                except Exception as e:
+                    errors.record(line_offset, line, e)
+
+                if (counter % save_steps == 0) if worker_budget is None else (buffered >= worker_budget):
+                    # dump in pickle to free memory
+                    n_pickle_dump += 1
+                    buffered = 0
+                    suffix = '_w{:03d}_{:05d}'.format(worker, n_pickle_dump)
+                    shard = {'worker': worker, 'index': n_pickle_dump,
+                             'first_offset': first_offset, 'end_offset': end_offset}
+                    errors.flush()
+                    if collect_facts:
+                        facts = write_to_pickle(pickle_path, facts, suffix, manifest, **shard)
+                        stats = write_stats_to_pickle(pickle_path, stats, suffix, manifest, **shard)
+                    if collect_labels:
+                        labels = write_labels_to_pickle(pickle_path, labels, suffix, manifest, **shard)
+                    for collector in collectors:
+                        collector.flush(pickle_path, suffix, manifest, **shard)
+                    first_offset = None
 
         n_pickle_dump +=1
-        suffix = '_' + str(process_id) + '_' + str(n_pickle_dump) + '_rest '
-        print(f'{process_id} Save The Rest {len(labels)} to {suffix}.')
+        suffix = '_w{:03d}_{:05d}'.format(worker, n_pickle_dump)
+        shard = {'worker': worker, 'index': n_pickle_dump, 'first_offset': first_offset, 'end_offset': end_offset}
+        print(f'Worker {worker} Save The Rest to {suffix}.')
 
+        errors.close()
         if collect_facts:
-            _, _ = write_to_pickle(pickle_path, facts, fails, suffix)
+            _ = write_to_pickle(pickle_path, facts, suffix, manifest, **shard)
+            _ = write_stats_to_pickle(pickle_path, stats, suffix, manifest, **shard)
         if collect_labels:
-            pickle.dump(labels, open(pickle_path + f'labels_dump{suffix}.pkl', 'wb'))
-            print(f'Pickled labels Number {suffix} Rest.')
+            _ = write_labels_to_pickle(pickle_path, labels, suffix, manifest, **shard)
+        for collector in collectors:
+            collector.flush(pickle_path, suffix, manifest, **shard)
+        if profiler is not None:
+            save_profile(profiler, path, 'w{:03d}'.format(worker))
+        results.put(manifest.shards)
 
     producer = Process(target=producer_func, args=(num_procs,))
     producer.daemon=True
@@ -266,30 +458,495 @@ def query_wikidata_dump_with_multi_processing(dump_path, path, n_lines, test_ent
     
     consumers=[]
     for i in range(num_procs):
-        consumer=Process(target=consumer_func)
+        consumer=Process(target=consumer_func, args=(i,))
         consumers.append(consumer)
         consumer.daemon=True
         consumer.start()
-    
+
+    # gather the shards written by each consumer, giving up as soon as a process died
+    manifest = Manifest(pickle_path)
+    n_done = 0
+    while n_done < num_procs:
+        try:
+            manifest.shards.extend(results.get(timeout=1))
+            n_done += 1
+            continue
+        except queue.Empty:
+            pass
+        dead = [i for i, consumer in enumerate(consumers) if consumer.exitcode not in (None, 0)]
+        if len(dead) > 0 or producer.exitcode not in (None, 0):
+            for i in dead:
+                failed[i] = 1
+            break
+    manifest.save('query', dump_path, num_procs=num_procs, complete=(n_done == num_procs))
+    if n_done < num_procs:
+        print(f'Only {n_done} of {num_procs} workers completed, the manifest is marked incomplete.')
+        for process in [producer] + consumers:
+            if process.is_alive():
+                process.terminate()
+    if profile:
+        write_profile_report(path)
+
     for consumer in consumers:
-        consumer.join()
+        consumer.join(timeout=1)
     
     print('Finish ALL !')
 
-def build_dataset(path, labels, return_=False, dump_date='23rd April 2019', multi_lingual=None):
-    """Builds datasets from the pickle files produced by the query_wikidata_dump.
+
+def range_manifest_name(worker):
+    return 'manifest_r{:03d}.json'.format(worker)
+
+
+def query_wikidata_dump_range(dump_path, path, worker, num_workers, n_lines=None, test_entities=None,
+                              collect_labels=False, multi_lingual=False, collectors=None, properties=None,
+                              exclude_properties=None, tail_entities=None, memory_lines=3000000, memory_budget=None,
+                              profile=False):
+    """This function processes the part of a Wikidata dump owned by `worker` out of `num_workers` workers, in the \
+    same way as `query_wikidata_dump`. The compressed dump is cut into `num_workers` byte ranges and each worker \
+    only decompresses the bz2 blocks starting in its range (see `wikidatasets.bz2blocks.iter_range_lines`), so that \
+    workers need no producer, nor each other. They can run on several machines sharing the `path` directory, \
+    `merge_range_manifests` being called once all of them are done.
+
+    Parameters
+    ----------
+    dump_path: str
+        Path to the latest-all.json.bz2 file downloaded from https://dumps.wikimedia.org/wikidatawiki/entities/.
+    path: str
+        Path to where pickle files will be written.
+    worker: int
+        Index of the worker, between 0 and num_workers - 1.
+    num_workers: int
+        Total number of workers.
+    n_lines: int
+        Number of lines of the dump. This can be an upper-bound as it is only used for displaying a progress bar.
+    test_entities, collect_labels, multi_lingual, collectors, properties, exclude_properties, tail_entities:
+        Same as in `query_wikidata_dump`.
+    memory_lines: int
+        Number of lines processed by the worker between two pickle dumps.
+    memory_budget: int
+        If given, replaces `memory_lines`: buffered facts and labels are pickled each time their approximate size \
+        reaches this number of bytes.
+    profile: bool or float
+        If True (or a sampling interval in seconds), the worker is profiled and saves its profile as \
+        profile/r003.json in `path`, to be aggregated by `wikidatasets.profiling.write_profile_report`.
+
+    Shards are named after the worker and their index (e.g. dump_r003_00012.pkl) and listed in the worker's own \
+    manifest, pickles/manifest_r003.json, with their range of 'block+offset' positions in the dump. The manifest of \
+    a previous run of the worker is removed when it starts and the new one is only saved once it is done, so that \
+    `merge_range_manifests` never merges the shards of another run.
+
+    """
+    from tqdm import tqdm
+    pickle_path = get_pickle_path(path)
+    collect_facts = (test_entities is not None)
+    collectors = [] if collectors is None else collectors
+    properties, exclude_properties, tail_entities = map(to_set, (properties, exclude_properties, tail_entities))
+    if os.path.exists(pickle_path + range_manifest_name(worker)):
+        os.remove(pickle_path + range_manifest_name(worker))
+    errors = ErrorLog(pickle_path + 'fails_r{:03d}.tsv'.format(worker))
+    manifest = Manifest(pickle_path, range_manifest_name(worker))
+    profiler = start_profiler(profile)
+    hot = hot_path(profiler)
+
+    n_pickle_dump = 0
+    if collect_labels:
+        labels = {}
+    if collect_facts:
+        facts = FactBuffer()
+        stats = DumpStats()
+
+    ids = set()
+    buffered = 0  # approximate number of bytes of the buffered facts and labels
+    progress_bar = tqdm(total=None if n_lines is None else n_lines // num_workers, position=worker)
+    counter = 0  # counter of the number of lines read
+    first_position, end_position = None, None  # dump range of the current shard
+
+    for position, line in iter_range_lines(dump_path, worker, num_workers):
+        if first_position is None:
+            first_position = position
+        end_position = (position[0], position[1] + len(line))
+        line = line.decode('utf-8').strip()
+        if len(line) == 0:
+            continue
+
+        counter += 1
+        progress_bar.update(1)
+
+        try:
+            line = hot.to_json(line)
+
+            if collect_labels:
+                id_ = hot.get_id(line)
+                if id_ in ids:
+                    continue
+                ids.add(id_)
+                if multi_lingual:
+                    labels[id_] = hot.get_multiligual_labels(line)
+                else:
+                    labels[id_] = hot.get_label(line)
+                buffered += sizeof_label(id_, labels[id_])
+
+            keep = True
+            if collect_facts:
+                triplets, instanceOf = hot.to_triplets(line, properties, exclude_properties, tail_entities)
+                keep = len(instanceOf) > 0 and hot.intersect(instanceOf, test_entities)
+                if keep:
+                    facts.extend(triplets)
+                    stats.add(triplets, instanceOf)
+                    buffered += sizeof_facts(triplets)
+            if keep:
+                for collector in collectors:
+                    collector.collect(line)
+
+        except Exception as e:
+            errors.record(position, line, e)
+
+        if (counter % memory_lines == 0) if memory_budget is None else (buffered >= memory_budget):
+            # dump in pickle to free memory
+            n_pickle_dump += 1
+            buffered = 0
+            suffix = '_r{:03d}_{:05d}'.format(worker, n_pickle_dump)
+            shard = {'worker': worker, 'index': n_pickle_dump,
+                     'first_offset': format_position(first_position), 'end_offset': format_position(end_position)}
+            errors.flush()
+            if collect_facts:
+                facts = write_to_pickle(pickle_path, facts, suffix, manifest, **shard)
+                stats = write_stats_to_pickle(pickle_path, stats, suffix, manifest, **shard)
+            if collect_labels:
+                labels = write_labels_to_pickle(pickle_path, labels, suffix, manifest, **shard)
+            for collector in collectors:
+                collector.flush(pickle_path, suffix, manifest, **shard)
+            first_position = None
+
+    n_pickle_dump += 1
+    suffix = '_r{:03d}_{:05d}'.format(worker, n_pickle_dump)
+    shard = {'worker': worker, 'index': n_pickle_dump,
+             'first_offset': None if first_position is None else format_position(first_position),
+             'end_offset': None if end_position is None else format_position(end_position)}
+    errors.close()
+    if collect_facts:
+        _ = write_to_pickle(pickle_path, facts, suffix, manifest, **shard)
+        _ = write_stats_to_pickle(pickle_path, stats, suffix, manifest, **shard)
+    if collect_labels:
+        _ = write_labels_to_pickle(pickle_path, labels, suffix, manifest, **shard)
+    for collector in collectors:
+        collector.flush(pickle_path, suffix, manifest, **shard)
+    manifest.save('query', dump_path, num_procs=num_workers, complete=True)
+    if profiler is not None:
+        save_profile(profiler, path, 'r{:03d}'.format(worker))
+
+
+def merge_range_manifests(dump_path, path, num_workers, failed_workers=None):
+    """Merges the manifests written by the `num_workers` calls to `query_wikidata_dump_range` into the manifest.json \
+    read by `build_dataset`. The run is marked incomplete if the manifest of a worker is missing or if the worker is \
+    in `failed_workers` (e.g. its process exited with an error).
+
+    Returns
+    -------
+    complete: bool
+        Boolean indicating whether all the workers completed.
+    """
+    pickle_path = get_pickle_path(path)
+    manifest = Manifest(pickle_path)
+    failed_workers = set() if failed_workers is None else set(failed_workers)
+    missing = []
+    for worker in range(num_workers):
+        if worker in failed_workers or not os.path.exists(pickle_path + range_manifest_name(worker)):
+            missing.append(worker)
+            continue
+        manifest.shards.extend(Manifest.load(pickle_path, range_manifest_name(worker)).shards)
+    manifest.save('query', dump_path, num_procs=num_workers, complete=(len(missing) == 0))
+    if len(missing) > 0:
+        print(f'Workers {missing} did not complete, the manifest is marked incomplete.')
+    return len(missing) == 0
+
+
+def query_wikidata_dump_with_range_workers(dump_path, path, n_lines=None, test_entities=None, collect_labels=False,
+                                           multi_lingual=False, num_procs=4, memory_lines=3000000, collectors=None,
+                                           properties=None, exclude_properties=None, tail_entities=None,
+                                           memory_budget=None, profile=False, profile_workers=None):
+    """Runs `query_wikidata_dump_range` in `num_procs` processes, each one owning a byte range of the dump, and \
+    merges their manifests. Unlike `query_wikidata_dump_with_multi_processing`, no process reads the whole dump.
+
+    Parameters
+    ----------
+    num_procs: int
+        Number of worker processes.
+    memory_lines: int
+        Total number of lines buffered by the workers before pickling (each worker pickles every \
+        memory_lines/num_procs lines).
+    memory_budget: int
+        If given, replaces `memory_lines`: total number of bytes of facts and labels buffered by the workers.
+    profile: bool or float
+        If True (or a sampling interval in seconds), the workers are profiled and their profiles aggregated in the \
+        profile/ directory of `path`.
+    profile_workers: list
+        Indices of the workers to profile, all of them by default.
+
+    Other parameters are the same as in `query_wikidata_dump`.
+
+    Returns
+    -------
+    complete: bool
+        Boolean indicating whether all the workers completed.
+    """
+    from multiprocessing import Process
+
+    kwargs = {'n_lines': n_lines, 'test_entities': test_entities, 'collect_labels': collect_labels,
+              'multi_lingual': multi_lingual, 'collectors': collectors, 'properties': properties,
+              'exclude_properties': exclude_properties, 'tail_entities': tail_entities,
+              'memory_lines': max(1, memory_lines // num_procs),
+              'memory_budget': None if memory_budget is None else memory_budget // num_procs}
+    if profile:
+        clear_profiles(path)
+    workers = []
+    for worker in range(num_procs):
+        worker_profile = profile if profile_workers is None or worker in profile_workers else False
+        process = Process(target=query_wikidata_dump_range, args=(dump_path, path, worker, num_procs),
+                          kwargs=dict(kwargs, profile=worker_profile))
+        process.start()
+        workers.append(process)
+    for process in workers:
+        process.join()
+    if profile:
+        write_profile_report(path)
+    failed = [worker for worker, process in enumerate(workers) if process.exitcode != 0]
+    return merge_range_manifests(dump_path, path, num_procs, failed_workers=failed)
+
+
+def expand_dataset(dump_path, path, n_lines, hops=1, properties=None, exclude_properties=None, collectors=None,
+                   compression=None):
+    """This function expands a dataset built by `build_dataset` to the neighborhood of its attribute entities. Each \
+    hop is one pass through the dump collecting the facts of the entities of the frontier (first the attribute \
+    entities, then the new tails of the previous hop). Lines of entities out of the frontier are skipped without \
+    being parsed.
+
+    The facts are written as new dump{n}.pkl files in the pickles/ directory of the dataset, numbered after the \
+    existing ones, so that `build_dataset` can be run again to build the expanded dataset.
 
     Parameters
     ----------
+    dump_path: str
+        Path to the latest-all.json.bz2 file downloaded from https://dumps.wikimedia.org/wikidatawiki/entities/.
     path: str
-        Path to the directory where there should already be a pickles/ directory. In the latter directory, all \
-        the .pkl files will be concatenated into one dataset.
-    labels: dict
-        Dictionary collected by the query_wikidata_dump function when collect_labels is set to True.
+        Path to the directory of the dataset built by `build_dataset`.
+    n_lines: int
+        Number of lines of the dump. This can be an upper-bound as it is only used for displaying a progress bar.
+    hops: int
+        Number of passes through the dump, i.e. depth of the expansion.
+    properties: list
+        Allow-list of relations whose facts are collected.
+    exclude_properties: list
+        Deny-list of relations whose facts are not collected.
+    collectors: list
+        List of `wikidatasets.collectors.Collector` instances run on each expanded entity.
+    compression: str
+        Compression used when building the dataset (None, 'gzip' or 'zstd').
+
+    Returns
+    -------
+    frontier: EntityBitmap
+        Entities reached by the last hop whose facts were not collected.
+    """
+    import pandas as pd
+    from tqdm import tqdm
+    if path[-1] != '/':
+        path = path + '/'
+    pickle_path = get_pickle_path(path)
+    collectors = [] if collectors is None else collectors
+    properties, exclude_properties = to_set(properties), to_set(exclude_properties)
+    n_pickle_dump = len([name for name in os.listdir(pickle_path) if name[:4] == 'dump' and name[-4:] == '.pkl'])
+    manifest = Manifest(pickle_path) if os.path.exists(pickle_path + Manifest.file_name) else None
+
+    suffix = COMPRESSION_SUFFIXES[compression]
+    entities = pd.read_csv(path + 'entities.tsv' + suffix, sep='\t', usecols=['wikidataID'])['wikidataID']
+    visited = EntityBitmap(pd.read_csv(path + 'nodes.tsv' + suffix, sep='\t', usecols=['wikidataID'])['wikidataID'])
+    frontier = EntityBitmap(ent for ent in entities if ent not in visited)
+    del entities
+
+    for hop in range(hops):
+        print('Hop {}: expanding {} entities.'.format(hop + 1, len(frontier)))
+        next_frontier = EntityBitmap()
+        facts = FactBuffer()
+        stats = DumpStats()
+        errors = ErrorLog(pickle_path + 'fails_expand{}.tsv'.format(hop + 1))
+        dump = bz2.open(dump_path, 'rb')
+        progress_bar = tqdm(total=n_lines)
+        counter = 0  # counter of the number of lines read
+        offset = len(dump.readline())  # the first line of the file should be "[\n" so we skip it
+        first_offset = offset  # offset of the first line of the current shard
+
+        while True:
+            line = dump.readline()
+            line_offset = offset
+            offset += len(line)
+            line = line.decode('utf-8').strip()
+            if len(line) == 0:
+                break
+
+            counter += 1
+            progress_bar.update(1)
+
+            if counter % 3000000 == 0:
+                # dump in pickle to free memory
+                n_pickle_dump += 1
+                errors.flush()
+                shard = {'stage': 'expand', 'index': n_pickle_dump, 'first_offset': first_offset,
+                         'end_offset': line_offset}
+                facts = write_to_pickle(pickle_path, facts, n_pickle_dump, manifest, **shard)
+                stats = write_stats_to_pickle(pickle_path, stats, n_pickle_dump, manifest, **shard)
+                for collector in collectors:
+                    collector.flush(pickle_path, n_pickle_dump, manifest, **shard)
+                first_offset = line_offset
+
+            id_ = peek_id(line)
+            if id_ is not None and id_ not in frontier:
+                continue
+
+            try:
+                line = to_json(line)
+                if get_id(line) not in frontier:
+                    continue
+                triplets, instanceOf = to_triplets(line, properties, exclude_properties)
+                facts.extend(triplets)
+                stats.add(triplets, instanceOf)
+                for _, _, e2 in triplets:
+                    if e2 not in visited and e2 not in frontier:
+                        next_frontier.add(e2)
+                for collector in collectors:
+                    collector.collect(line)
+
+            except Exception as e:
+                errors.record(line_offset, line, e)
+
+        dump.close()
+        errors.close()
+        n_pickle_dump += 1
+        shard = {'stage': 'expand', 'index': n_pickle_dump, 'first_offset': first_offset, 'end_offset': offset}
+        _ = write_to_pickle(pickle_path, facts, n_pickle_dump, manifest, **shard)
+        _ = write_stats_to_pickle(pickle_path, stats, n_pickle_dump, manifest, **shard)
+        for collector in collectors:
+            collector.flush(pickle_path, n_pickle_dump, manifest, **shard)
+
+        visited.update(frontier)
+        frontier = next_frontier
+
+    if manifest is not None:
+        manifest.save('expand', dump_path, num_procs=1, complete=True)
+    return frontier
+
+
+def replay_errors(dump_path, path, test_entities=None, collect_labels=False, multi_lingual=False, error_logs=None,
+                  properties=None, exclude_properties=None, tail_entities=None):
+    """This function processes again only the lines of the dump logged as failed by `query_wikidata_dump`, its \
+    multiprocessing variant or the range workers. Recovered facts are written as a new dump{n}.pkl file and labels \
+    as labels_dump_replay.pkl. Lines failing again are logged in fails_replay.tsv.
+
+    Lines logged by the range workers (fails_r{worker}.tsv) are read directly from their bz2 block. Lines logged \
+    by the serial and multiprocessing loops (fails.tsv, fails_w{worker}.tsv) are logged by their offset in the \
+    decompressed dump, which can only be reached by decompressing the dump up to it: replaying them costs a \
+    sequential pass on the dump up to the last failed line (see `wikidatasets.utils.iter_failed_lines`). Extract \
+    with the range workers (`query_wikidata_dump_with_range_workers`) for failures which are cheap to replay.
+
+    Parameters
+    ----------
+    dump_path: str
+        Path to the latest-all.json.bz2 file the logs were written from.
+    path: str
+        Path given to `query_wikidata_dump`, containing the pickles/ directory.
+    test_entities: list
+        Same as in `query_wikidata_dump`.
+    collect_labels: bool
+        Same as in `query_wikidata_dump`.
+    multi_lingual: bool
+        Same as in `query_wikidata_dump`.
+    error_logs: list
+        Paths to the error logs to replay. By default all the fails*.tsv files of the pickles/ directory except \
+        fails_replay.tsv and the fails_expand{hop}.tsv logs of `expand_dataset`, whose lines were filtered on the \
+        frontier entities rather than on `test_entities`.
+    properties, exclude_properties, tail_entities:
+        Same as in `query_wikidata_dump`.
+
+    Returns
+    -------
+    n_errors: int
+        Number of lines which failed again.
+    """
+    from tqdm import tqdm
+    pickle_path = get_pickle_path(path)
+    collect_facts = (test_entities is not None)
+    properties, exclude_properties, tail_entities = map(to_set, (properties, exclude_properties, tail_entities))
+    if error_logs is None:
+        error_logs = [pickle_path + name for name in sorted(os.listdir(pickle_path))
+                      if name[:5] == 'fails' and name[-4:] == '.tsv' and name != 'fails_replay.tsv'
+                      and name[:12] != 'fails_expand']
+    failed = read_error_logs(error_logs)  # before fails_replay.tsv is truncated, in case it is replayed
+    offsets = [offset for offset, _, _ in failed if not isinstance(offset, tuple)]
+    if len(offsets) > 0:
+        print('{} lines are logged by their offset in the decompressed dump, reading them decompresses the dump up '
+              'to byte {}.'.format(len(offsets), max(offsets)))
+    errors = ErrorLog(pickle_path + 'fails_replay.tsv')
+    facts, labels = FactBuffer(), {}
+
+    for line_offset, line in tqdm(iter_failed_lines(dump_path, failed)):
+        try:
+            line = to_json(line)
+
+            if collect_labels:
+                if multi_lingual:
+                    labels[get_id(line)] = get_multiligual_labels(line)
+                else:
+                    labels[get_id(line)] = get_label(line)
+
+            if collect_facts:
+                triplets, instanceOf = to_triplets(line, properties, exclude_properties, tail_entities)
+                if len(instanceOf) > 0 and intersect(instanceOf, test_entities):
+                    facts.extend(triplets)
+
+        except Exception as e:
+            errors.record(line_offset, line, e)
+
+    errors.close()
+    manifest = Manifest(pickle_path) if os.path.exists(pickle_path + Manifest.file_name) else None
+    n_pickle_dump = len([name for name in os.listdir(pickle_path) if name[:4] == 'dump' and name[-4:] == '.pkl']) + 1
+    if collect_facts:
+        _ = write_to_pickle(pickle_path, facts, n_pickle_dump, manifest, stage='replay', index=n_pickle_dump)
+    if collect_labels:
+        _ = write_labels_to_pickle(pickle_path, labels, '_replay', manifest, stage='replay', index=n_pickle_dump)
+    if manifest is not None:
+        manifest.save('replay', dump_path, num_procs=1, complete=True)
+    return errors.n_errors
+
+
+def build_dataset(path, labels, return_=False, dump_date='23rd April 2019', multi_lingual=None, num_procs=None,
+                  compression=None, verify=False):
+    """Builds datasets from the pickle files produced by the query_wikidata_dump. Statistics of the dataset and of \
+    the extraction are written in stats.pkl (see `wikidatasets.utils.load_stats`).
+
+    Parameters
+    ----------
+    path: str
+        Path to the directory where there should already be a pickles/ directory. In the latter directory, the \
+        facts pickle files listed in manifest.json (or all the dump{n}.pkl files if there is no manifest) will be \
+        concatenated into one dataset.
+    labels: dict or pandas.DataFrame
+        Dictionary collected by the query_wikidata_dump function when collect_labels is set to True, or label store \
+        built from it by `build_label_store`.
     return_: bool
         Boolean indicating if the built dataset should be returned on top of being written on disk.
     dump_date: str
         String indicating the date of the Wikidata dump used. It is used in the readme of the dataset.
+    multi_lingual: list
+        List of languages for which a label column should be written (labels must then be multi-lingual).
+    num_procs: int
+        If given, the dataset is built in parallel by this number of worker processes: they load and encode the \
+        pickle files (see `wikidatasets.utils.concatpkls_parallel`) and format the facts of each of them (see \
+        `wikidatasets.utils.write_facts_parallel`) as well as chunks of the entities and relations files. The output \
+        is identical to the one of the serial path.
+    compression: str
+        Either None, 'gzip' or 'zstd'. If given, the .tsv files are compressed and get a .gz or .zst suffix.
+    verify: bool
+        Boolean indicating if the checksums of the pickle files listed in the manifest should be verified.
 
     Returns
     -------
@@ -302,61 +959,47 @@ def build_dataset(path, labels, return_=False, dump_date='23rd April 2019', mult
     relations: pandas.DataFrame
         DataFrame containing a list of all relations with their Wikidata IDs and labels.
     """
+    import pandas as pd
 
     if path[-1] != '/':
         path = path+'/'
     path_pickle = path + 'pickles/'
-    n_files = len([name for name in os.listdir(path_pickle) if name[-4:] == '.pkl'])
-    df = concatpkls(n_files, path_pickle)
-
-    ents = list(df['headEntity'].unique())
-    feats = list(set(df['tailEntity'].unique()) - set(ents))
-    ent2ix = {ent: i for i, ent in enumerate(ents + feats)}
-    ix2ent = {i: ent for ent, i in ent2ix.items()}
+    files = get_fact_files(path_pickle, verify=verify)
 
-    tmp = df['relation'].unique()
-    rel2ix = {rel: i for i, rel in enumerate(tmp)}
-    ix2rel = {i: rel for rel, i in rel2ix.items()}
+    if num_procs is None:
+        df, ents, feats, rels = factorize_facts(concatpkls(len(files), path_pickle, files=files))
+    else:
+        df, ents, feats, rels, bounds = concatpkls_parallel(files, num_procs)
 
-    df['headEntity'] = df['headEntity'].apply(lambda x: ent2ix[x])
-    df['tailEntity'] = df['tailEntity'].apply(lambda x: ent2ix[x])
-    df['relation'] = df['relation'].apply(lambda x: rel2ix[x])
+    edges_mask, is_head, counts = split_core_attributes(df, len(ents) + len(feats), len(rels))
+    stats = dataset_stats(df, edges_mask, len(ents) + len(feats), rels)
 
-    nodes = pd.DataFrame([[i, ix2ent[i]] for i in range(len(ents))],
-                         columns=['entityID', 'wikidataID'])
-    entities = pd.DataFrame([[i, ix2ent[i]] for i in range(len(ix2ent))],
-                            columns=['entityID', 'wikidataID'])
-    relations = pd.DataFrame([[i, ix2rel[i]] for i in range(len(ix2rel))],
-                             columns=['relationID', 'wikidataID'])
+    entities = pd.DataFrame({'entityID': range(len(ents) + len(feats)), 'wikidataID': ents + feats})
+    relations = pd.DataFrame({'relationID': range(len(rels)), 'wikidataID': rels})
 
     if multi_lingual is not None:
         assert isinstance(multi_lingual, list)
-        for lang in multi_lingual:
-            nodes[lang+'_label'] = nodes['wikidataID'].apply(multi_lingual_relabel, args=(labels,lang))
-            entities[lang+'_label'] = entities['wikidataID'].apply(multi_lingual_relabel, args=(labels,lang))
-            relations[lang+'_label'] = relations['wikidataID'].apply(multi_lingual_relabel, args=(labels,lang))
-    else:
-        nodes['label'] = nodes['wikidataID'].apply(relabel, args=(labels,))
-        entities['label'] = entities['wikidataID'].apply(relabel, args=(labels,))
-        relations['label'] = relations['wikidataID'].apply(relabel, args=(labels,))   
+    if isinstance(labels, dict):
+        labels = build_label_store(labels, ids=ents + feats + rels, languages=multi_lingual)
+    elif multi_lingual is not None:
+        labels = labels[[lang + '_label' for lang in multi_lingual]]
+    entities = relabel_frame(entities, labels)
+    relations = relabel_frame(relations, labels)
+    nodes = entities.loc[is_head]
 
-    edges_mask = df.tailEntity.isin(df['headEntity'].unique())
     edges = df.loc[edges_mask, ['headEntity', 'tailEntity', 'relation']]
     attributes = df.loc[~edges_mask, ['headEntity', 'tailEntity', 'relation']]
 
-    write_csv(edges, path + 'edges.tsv')
-    write_csv(attributes, path + 'attributes.tsv')
-    write_ent_dict(nodes, path + 'nodes.tsv')
-    write_ent_dict(entities, path + 'entities.tsv')
-    write_rel_dict(relations, path + 'relations.tsv')
-    write_readme(path+'readme.md',
-                 n_core_ents=attributes['headEntity'].nunique(),
-                 n_attrib_ents=attributes['tailEntity'].nunique(),
-                 n_core_rels=edges['relation'].nunique(),
-                 n_attrib_rels=attributes['relation'].nunique(),
-                 n_core_facts=len(edges),
-                 n_attrib_facts=len(attributes),
-                 dump_date=dump_date)
+    if num_procs is None:
+        write_csv(edges, path + 'edges.tsv', compression=compression)
+        write_csv(attributes, path + 'attributes.tsv', compression=compression)
+    else:
+        write_facts_parallel(df, edges_mask, bounds, path, num_procs, compression=compression)
+    write_ent_dict(nodes, path + 'nodes.tsv', num_procs=num_procs, compression=compression)
+    write_ent_dict(entities, path + 'entities.tsv', num_procs=num_procs, compression=compression)
+    write_rel_dict(relations, path + 'relations.tsv', num_procs=num_procs, compression=compression)
+    write_readme(path+'readme.md', dump_date=dump_date, **counts)
+    write_stats(path + 'stats.pkl', stats, load_dump_stats(path_pickle))
 
     if return_:
         return edges, attributes, entities, relations
@@ -0,0 +1,193 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from collections import Counter
+
+
+class Profiler:
+    """Opt-in profiler of a dump processing worker. It combines a sampling profiler, recording the stack of the \
+    profiled thread every `interval` seconds of CPU time, and the timing of the functions wrapped by `timed`. Each \
+    worker saves its own profile with `save` and `write_profile_report` aggregates the profiles of all the workers.
+
+    Samples are taken by a SIGPROF handler when the profiler is started in the main thread, which is the case of \
+    the worker processes. Otherwise they are taken by a thread, every `interval` seconds of wall time, which \
+    over-represents the code releasing the GIL (e.g. the decompression of the dump).
+
+    Parameters
+    ----------
+    interval: float
+        Time in seconds between two samples of the stack. No sampling is done if None.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()  # collapsed stack -> number of samples
+        self.timings = {}  # name -> [number of calls, total time in seconds]
+        self.wall = 0.0
+        self.thread_id = None
+        self.started = None
+        self.stopping = threading.Event()
+        self.sampler = None
+        self.handler = None
+
+    def start(self):
+        """Start profiling the calling thread."""
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        if self.interval is None:
+            return self
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+            self.handler = signal.signal(signal.SIGPROF, self.on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.sampler = threading.Thread(target=self.sample, daemon=True)
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        self.wall += time.perf_counter() - self.started
+        if self.handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.handler)
+            self.handler = None
+        if self.sampler is not None:
+            self.stopping.set()
+            self.sampler.join()
+            self.sampler = None
+
+    def on_signal(self, signum, frame):
+        self.samples[collapse_stack(frame)] += 1
+
+    def sample(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+
+    def save(self, file_name):
+        with open(file_name, 'w', encoding='utf-8') as f:
+            json.dump({'interval': self.interval, 'wall': self.wall, 'samples': self.samples,
+                       'timings': self.timings}, f)
+
+
+def collapse_stack(frame):
+    """Stack of `frame` as 'outer;...;inner' frames named file:function, the format of flame graph tools."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        if code is not TIMED_CODE:
+            names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def timed(profiler, func, name=None):
+    """`func` itself if `profiler` is None, otherwise a wrapper adding the number of calls and running time of \
+    `func` to the timings of `profiler` under `name` (the name of the function by default).
+
+    """
+    if profiler is None:
+        return func
+    timing = profiler.timings.setdefault(name or func.__name__, [0, 0.0])
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing[0] += 1
+            timing[1] += clock() - start
+    return wrapper
+
+
+TIMED_CODE = timed(Profiler(), print).__code__  # frames of the wrappers are left out of the stacks
+
+
+def start_profiler(profile):
+    """Started `Profiler` if `profile` is True (or a sampling interval in seconds), None otherwise."""
+    if profile is None or profile is False:
+        return None
+    return (Profiler() if profile is True else Profiler(interval=profile)).start()
+
+
+def get_profile_path(path):
+    if path[-1] != '/':
+        path = path + '/'
+    profile_path = path + 'profile/'
+    if not os.path.exists(profile_path):
+        os.makedirs(profile_path)
+    return profile_path
+
+
+def clear_profiles(path):
+    """Remove the profiles saved in the profile/ directory of `path` by a previous run, so that \
+    `write_profile_report` only aggregates the profiles of the run about to start.
+
+    """
+    profile_path = get_profile_path(path)
+    for name in os.listdir(profile_path):
+        if name.endswith('.json'):
+            os.remove(profile_path + name)
+
+
+def save_profile(profiler, path, name):
+    """Stop `profiler` and save it in the profile/ directory of `path` as {name}.json."""
+    profiler.stop()
+    profiler.save(get_profile_path(path) + name + '.json')
+
+
+def write_profile_report(path):
+    """Aggregates the profiles saved by the workers in the profile/ directory of `path` (cleared by \
+    `clear_profiles` when a profiled run starts) into:
+
+    - profile.folded: the collapsed stacks of all the samples, e.g. for `flamegraph.pl profile.folded > flame.svg` \
+      or speedscope,
+    - profile.txt: the timings of the wrapped functions and the functions most often on top of the stacks.
+
+    Returns
+    -------
+    timings: dict
+        Dictionary {name: [number of calls, total time in seconds]} summed over the workers.
+    """
+    profile_path = get_profile_path(path)
+    names = sorted(name for name in os.listdir(profile_path) if name.endswith('.json'))
+    samples, timings, wall, intervals = Counter(), {}, 0.0, set()
+    for name in names:
+        with open(profile_path + name, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        samples.update(profile['samples'])
+        for func, (calls, seconds) in profile['timings'].items():
+            timing = timings.setdefault(func, [0, 0.0])
+            timing[0] += calls
+            timing[1] += seconds
+        wall += profile['wall']
+        intervals.add(profile['interval'])
+
+    with open(profile_path + 'profile.folded', 'w', encoding='utf-8') as f:
+        for stack, count in sorted(samples.items()):
+            f.write('{} {}\n'.format(stack, count))
+
+    own = Counter()
+    for stack, count in samples.items():
+        own[stack.rsplit(';', 1)[-1]] += count
+    n_samples = sum(samples.values())
+    with open(profile_path + 'profile.txt', 'w', encoding='utf-8') as f:
+        f.write('Profiles of {} worker(s): {}\n'.format(len(names), ', '.join(name[:-5] for name in names)))
+        f.write('Wall time: {:.1f} s (summed over the workers)\n'.format(wall))
+        f.write('Samples: {} (interval: {} s)\n\n'.format(
+            n_samples, ', '.join(str(interval) for interval in sorted(intervals, key=str))))
+        f.write('{:<32}{:>14}{:>14}{:>16}{:>10}\n'.format('function', 'calls', 'total (s)', 'per call (us)',
+                                                         'wall %'))
+        for func, (calls, seconds) in sorted(timings.items(), key=lambda t: -t[1][1]):
+            if calls == 0:
+                continue
+            f.write('{:<32}{:>14}{:>14.2f}{:>16.2f}{:>10.1f}\n'.format(
+                func, calls, seconds, 1e6 * seconds / max(calls, 1), 100 * seconds / wall if wall > 0 else 0))
+        f.write('\n{:<60}{:>14}{:>10}\n'.format('top of stack', 'samples', '%'))
+        for func, count in own.most_common(30):
+            f.write('{:<60}{:>14}{:>10.1f}\n'.format(func, count, 100 * count / n_samples))
+    return timings
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import queue
+import time
+
+from urllib.parse import urlencode, urlsplit
+
+WIKIDATA_SPARQL = "https://query.wikidata.org/sparql"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SPARQLError(Exception):
+    pass
+
+
+class SPARQLClient:
+    """SPARQL client sending batches of queries concurrently over a pool of kept-alive connections. Results are \
+    stored in a content-addressed cache on disk (one json file per query, named after the hash of the endpoint and \
+    the query) so that repeated builds do not hit the network.
+
+    Parameters
+    ----------
+    endpoint_url: str
+        URL of the SPARQL endpoint (http or https).
+    cache_dir: str
+        Directory of the cache of results. No cache is used if None.
+    max_concurrency: int
+        Maximum number of queries running at the same time (and of open connections).
+    max_retries: int
+        Number of retries of a query after a connection error or a 429/5xx answer.
+    backoff: float
+        Initial waiting time in seconds before a retry, doubled at each retry. A Retry-After header overrides it.
+    timeout: float
+        Timeout in seconds of the connections.
+    offline: bool
+        If True, queries missing from the cache raise a SPARQLError instead of being sent.
+    """
+    def __init__(self, endpoint_url=WIKIDATA_SPARQL, cache_dir=None, max_concurrency=4, max_retries=5, backoff=1.0,
+                 timeout=60, offline=False, user_agent='wikidatasets (https://github.com/liyucheng09/wikidatasets)'):
+        url = urlsplit(endpoint_url)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError('Unsupported endpoint scheme {}.'.format(url.scheme))
+        self.endpoint_url = endpoint_url
+        self.url = url
+        self.cache_dir = cache_dir
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.offline = offline
+        self.headers = {'Accept': 'application/sparql-results+json',
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                        'User-Agent': user_agent}
+        self.connections = queue.LifoQueue()
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def cache_path(self, query):
+        key = hashlib.sha256((self.endpoint_url + '\n' + query).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def read_cache(self, query):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.cache_path(query), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_cache(self, query, result):
+        if self.cache_dir is None:
+            return
+        file = self.cache_path(query)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(file, os.getpid())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp, file)
+
+    def get_connection(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            if self.url.scheme == 'https':
+                return http.client.HTTPSConnection(self.url.netloc, timeout=self.timeout)
+            return http.client.HTTPConnection(self.url.netloc, timeout=self.timeout)
+
+    def send(self, query):
+        """Send `query` with blocking IO, retrying with exponential backoff.
+
+        Returns
+        -------
+        result: dict
+            Parsed json results of the query.
+        """
+        body = urlencode({'query': query, 'format': 'json'})
+        path = self.url.path or '/'
+        wait = self.backoff
+        for attempt in range(self.max_retries + 1):
+            connection = self.get_connection()
+            retry_after = None
+            try:
+                connection.request('POST', path, body=body, headers=self.headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                error = SPARQLError('Connection to {} failed: {}'.format(self.endpoint_url, e))
+            else:
+                if response.status == 200:
+                    self.connections.put(connection)
+                    return json.loads(content.decode('utf-8'))
+                if response.will_close:
+                    connection.close()
+                else:
+                    self.connections.put(connection)
+                error = SPARQLError('Query failed with status {}: {}'.format(
+                    response.status, content[:200].decode('utf-8', 'replace')))
+                if response.status not in RETRY_STATUSES:
+                    raise error
+                retry_after = response.getheader('Retry-After')
+            if attempt == self.max_retries:
+                raise error
+            if retry_after is not None and retry_after.isdigit():
+                time.sleep(int(retry_after))
+            else:
+                time.sleep(wait)
+            wait *= 2
+
+    async def query_async(self, query, semaphore=None):
+        result = self.read_cache(query)
+        if result is not None:
+            return result
+        if self.offline:
+            raise SPARQLError('Query missing from the cache in offline mode: {}'.format(query))
+        if semaphore is None:
+            result = await asyncio.to_thread(self.send, query)
+        else:
+            async with semaphore:
+                result = await asyncio.to_thread(self.send, query)
+        self.write_cache(query, result)
+        return result
+
+    async def query_many_async(self, queries):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*[self.query_async(query, semaphore) for query in queries])
+
+    def query(self, query):
+        """Result of one query, parsed from json."""
+        return self.query_many([query])[0]
+
+    def query_many(self, queries):
+        """Results of a list of queries, sent concurrently, in the same order as `queries`."""
+        return asyncio.run(self.query_many_async(queries))
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
@@ -1,15 +1,18 @@
+import bz2
 import pickle
 import json
-import pandas as pd
+import re
+import numpy as np
 import os
 
-from wikidatasets.exceptions import ParsingException
-from tqdm import tqdm
-
-from SPARQLWrapper import SPARQLWrapper, JSON
+from array import array
+from collections import Counter
+from wikidatasets.exceptions import ParsingException, ManifestException
+from wikidatasets.bz2blocks import format_position, parse_position, read_line
 
 
 def get_results(endpoint_url, query):
+    from SPARQLWrapper import SPARQLWrapper, JSON
     sparql = SPARQLWrapper(endpoint_url)
     sparql.setQuery(query)
     sparql.setReturnFormat(JSON)
@@ -46,38 +49,114 @@ def concat_claims(claims):
             yield claim
 
 
-def to_triplets(ent):
+def to_triplets(ent, properties=None, exclude_properties=None, tail_entities=None):
     """
 
     Parameters
     ----------
     ent: dict
         Dictionary coming from the parsing of a json line of the dump.
+    properties: set
+        If given, only the facts of these relations are returned.
+    exclude_properties: set
+        If given, the facts of these relations are not returned.
+    tail_entities: set
+        If given, only the facts whose tail is in this set are returned.
 
     Returns
     -------
     triplets: list
         List of triplets of this entity (head, rel, tail).
+    instanceof: list
+        List of the classes this entity is an instance of (P31), whatever the filters.
     """
     if len(ent['claims']) == 0:
         return []
-    claims = concat_claims(ent['claims'])
     triplets = []
     instanceof = []
     e1 = ent['id']
-    for claim in claims:
-        mainsnak = claim['mainsnak']
-        if mainsnak['snaktype'] != "value":
+    for rel, rel_claims in ent['claims'].items():
+        # claims are grouped by relation so unwanted relations are skipped as a whole
+        keep_rel = ((properties is None or rel in properties) and
+                    (exclude_properties is None or rel not in exclude_properties))
+        if not keep_rel and rel != 'P31':
             continue
-        if mainsnak['datatype'] == 'wikibase-item':
-            rel = mainsnak['property']
-            e2 = 'Q{}'.format(mainsnak['datavalue']['value']['numeric-id'])
-            triplets.append((e1, rel, e2))
-            if rel == 'P31':
-                instanceof.append(e2)
+        for claim in rel_claims:
+            mainsnak = claim['mainsnak']
+            if mainsnak['snaktype'] != "value":
+                continue
+            if mainsnak['datatype'] == 'wikibase-item':
+                e2 = 'Q{}'.format(mainsnak['datavalue']['value']['numeric-id'])
+                if rel == 'P31':
+                    instanceof.append(e2)
+                if keep_rel and (tail_entities is None or e2 in tail_entities):
+                    triplets.append((e1, rel, e2))
     return triplets, instanceof
 
 
+def to_set(values):
+    return None if values is None else set(values)
+
+
+ID_PATTERN = re.compile(r'"id":\s*"([^"]+)"')
+
+
+def peek_id(line):
+    """Wikidata ID of a raw line of the dump, read without parsing the json (the entity ID is the first "id" key of \
+    the line). Returns None if no ID is found.
+
+    """
+    match = ID_PATTERN.search(line)
+    return None if match is None else match.group(1)
+
+
+class EntityBitmap:
+    """Compact set of Wikidata IDs: item IDs (Q...) are stored as one bit per numeric ID, other IDs in a set.
+
+    Parameters
+    ----------
+    ids: iterable
+        Initial Wikidata IDs.
+    """
+    def __init__(self, ids=()):
+        self.bits = bytearray()
+        self.others = set()
+        self.n_items = 0
+        self.update(ids)
+
+    def add(self, id_):
+        if id_[0] != 'Q':
+            self.others.add(id_)
+            return
+        n = int(id_[1:])
+        byte, bit = n >> 3, 1 << (n & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        if not self.bits[byte] & bit:
+            self.bits[byte] |= bit
+            self.n_items += 1
+
+    def update(self, ids):
+        for id_ in ids:
+            self.add(id_)
+
+    def __contains__(self, id_):
+        if id_[0] != 'Q':
+            return id_ in self.others
+        n = int(id_[1:])
+        byte = n >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (n & 7)))
+
+    def __len__(self):
+        return self.n_items + len(self.others)
+
+    def __iter__(self):
+        bits = np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8), bitorder='little')
+        for n in np.flatnonzero(bits):
+            yield 'Q{}'.format(n)
+        yield from self.others
+
+
 def get_type(ent):
     return ent['type']
 
@@ -125,7 +204,7 @@ def relabel(x, labels):
     except KeyError:
         return x
 
-def multi_lingual_relabel(x, label, lang):
+def multi_lingual_relabel(x, labels, lang):
     try:
         lab = labels[x]
         lab = lab[lang]
@@ -133,9 +212,108 @@ def multi_lingual_relabel(x, label, lang):
             return lab[lab.index(':')+1:]
         else:
             return lab
-    except KeyError:
+    except (KeyError, TypeError):
         return None
 
+
+def normalize_labels(labels):
+    """Vectorized version of the rule of `relabel`: labels containing ':' are cut after the first ':'.
+
+    Parameters
+    ----------
+    labels: pandas.Series
+        Series of labels (str or None).
+
+    Returns
+    -------
+    labels: pandas.Series
+        Normalized labels, missing labels staying missing.
+    """
+    labels = labels.astype(object)
+    present = labels.notna()
+    if present.any():
+        parts = labels[present].astype(str).str.partition(':')
+        labels[present] = parts[2].where(parts[1] == ':', parts[0]).astype(object)
+    return labels
+
+
+def build_label_store(labels, ids=None, languages=None):
+    """Builds a label store from a labels dictionary collected by `query_wikidata_dump`: a DataFrame indexed by \
+    Wikidata ID with normalized labels (see `normalize_labels`), computed once. It can be saved and given to \
+    `build_dataset` in place of the dictionary.
+
+    Parameters
+    ----------
+    labels: dict
+        Dictionary mapping Wikidata IDs to a label, or to a dictionary {language: label} if `languages` is given.
+    ids: list
+        If given, only the labels of these Wikidata IDs are kept (missing ones get missing labels). IDs given \
+        several times (e.g. a property which is both an entity and a relation) are kept once.
+    languages: list
+        Languages of multi-lingual labels (e.g. ['en', 'fr']). One column {lang}_label is built for each of them.
+
+    Returns
+    -------
+    store: pandas.DataFrame
+        DataFrame indexed by Wikidata ID with a 'label' column, or one '{lang}_label' column per language.
+    """
+    import pandas as pd
+    ids = list(labels.keys()) if ids is None else unique_in_order(ids)
+    values = [labels.get(id_) for id_ in ids]
+    index = pd.Index(ids, name='wikidataID')
+    if languages is None:
+        return pd.DataFrame({'label': normalize_labels(pd.Series(values, index=index, dtype=object))})
+    values = [lab if isinstance(lab, dict) else {} for lab in values]
+    return pd.DataFrame({lang + '_label': normalize_labels(pd.Series([lab.get(lang) for lab in values],
+                                                                     index=index, dtype=object))
+                         for lang in languages})
+
+
+def relabel_frame(df, store, id_column='wikidataID'):
+    """Adds the label columns of `store` to `df` with one join on `id_column`. As in `relabel`, a missing 'label' is \
+    replaced by the Wikidata ID, while missing multi-lingual labels stay missing (as in `multi_lingual_relabel`).
+
+    """
+    labelled = df.join(store, on=id_column)
+    if 'label' in store.columns:
+        labelled['label'] = labelled['label'].where(labelled['label'].notna(), labelled[id_column])
+    return labelled
+
+
+def load_labels(path):
+    """Labels dictionary pickled in the file `path`, or merged from the labels pickle files of the directory `path`: \
+    the labels shards listed in its manifest if it has one, all the labels*.pkl files otherwise.
+
+    """
+    if not os.path.isdir(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    if path[-1] != '/':
+        path = path + '/'
+    if os.path.exists(path + Manifest.file_name):
+        files = Manifest.load(path).files('labels')
+    else:
+        files = [path + name for name in sorted(os.listdir(path)) if name.startswith('labels') and name.endswith('.pkl')]
+    labels = {}
+    for file in files:
+        with open(file, 'rb') as f:
+            labels.update(pickle.load(f))
+    return labels
+
+
+def subset_labels(labels, languages):
+    """Multi-lingual labels restricted to `languages`, the entities without multi-lingual labels being dropped."""
+    return {id_: {lang: label.get(lang) for lang in languages}
+            for id_, label in labels.items() if isinstance(label, dict)}
+
+
+def write_labels_json(name, labels):
+    """Writes a labels dictionary as json lines {"id": ..., "labels": ...}."""
+    with open(name, 'w', encoding='utf-8') as f:
+        for id_, label in labels.items():
+            f.write(json.dumps({'id': id_, 'labels': label}, ensure_ascii=False) + '\n')
+
+
 def clean(str_):
     if str_[:31] == 'http://www.wikidata.org/entity/':
         return str_[31:]
@@ -153,11 +331,258 @@ def get_pickle_path(path):
     return pickle_path
 
 
-def write_to_pickle(pickle_path, facts, fails, n_pickle_dump):
-    pickle.dump((facts, fails),
-                open(pickle_path + 'dump{}.pkl'.format(n_pickle_dump), 'wb'))
+def encode_id(id_):
+    """Integer code of a Wikidata ID: n for the item Qn, -n for the property Pn."""
+    if id_[0] == 'Q':
+        return int(id_[1:])
+    if id_[0] == 'P':
+        return -int(id_[1:])
+    raise ParsingException('Unsupported Wikidata ID {}'.format(id_))
+
+
+def decode_ids(codes):
+    """Wikidata IDs of integer codes given by `encode_id`."""
+    return ['Q{}'.format(c) if c >= 0 else 'P{}'.format(-c) for c in codes]
+
+
+def decode_relations(codes):
+    """Wikidata IDs of relations stored as their number."""
+    return ['P{}'.format(c) for c in codes]
+
+
+def encode_id_column(col):
+    """Vectorized `encode_id` on a Series of Wikidata IDs."""
+    col = col.astype(str)
+    codes = col.str[1:].astype('int64')
+    return codes.where(col.str[0] != 'P', -codes).to_numpy()
+
+
+class FactBuffer:
+    """Growable columnar buffer of facts, holding the integer codes of heads and tails (see `encode_id`) and the \
+    numbers of the relations in typed arrays. A fact takes 20 bytes instead of 200+ for a tuple of three strings, \
+    and the columns are handed over to numpy without copy when the buffer is pickled.
+
+    """
+    __slots__ = ('heads', 'relations', 'tails')
+    itemsize = 20  # int64 head, int32 relation, int64 tail
+
+    def __init__(self):
+        self.heads = array('q')
+        self.relations = array('i')
+        self.tails = array('q')
+
+    def __len__(self):
+        return len(self.heads)
+
+    def extend(self, triplets):
+        """Append the (head, rel, tail) triplets returned by `to_triplets`."""
+        self.heads.extend([encode_id(e1) for e1, _, _ in triplets])
+        self.relations.extend([int(rel[1:]) for _, rel, _ in triplets])
+        self.tails.extend([encode_id(e2) for _, _, e2 in triplets])
+
+    def to_dict(self):
+        return {'headEntity': np.frombuffer(self.heads, dtype=np.int64),
+                'relation': np.frombuffer(self.relations, dtype=np.int32),
+                'tailEntity': np.frombuffer(self.tails, dtype=np.int64)}
+
+
+def write_to_pickle(pickle_path, facts, n_pickle_dump, manifest=None, **shard):
+    file_name = 'dump{}.pkl'.format(n_pickle_dump)
+    pickle.dump(facts.to_dict(), open(pickle_path + file_name, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
     print('Just made pickle dump number {}'.format(n_pickle_dump))
-    return [], []
+    if manifest is not None:
+        manifest.add(file_name, 'facts', len(facts), **shard)
+    return FactBuffer()
+
+
+def write_labels_to_pickle(pickle_path, labels, n_pickle_dump, manifest=None, **shard):
+    file_name = 'labels_dump{}.pkl'.format(n_pickle_dump)
+    pickle.dump(labels, open(pickle_path + file_name, 'wb'))
+    print('Pickle Labels Number {}'.format(n_pickle_dump))
+    if manifest is not None:
+        manifest.add(file_name, 'labels', len(labels), **shard)
+    return {}
+
+
+
+class DumpStats:
+    """Counters maintained by the dump loops on the entities whose facts are collected: number of facts per relation \
+    (before deduplication), number of entities per class they are instance of (P31) and number of entities. They are \
+    pickled next to the facts as stats_dump{n}.pkl files each time the loop flushes, so that the extraction can be \
+    profiled before building the dataset (see `load_dump_stats`).
+
+    """
+    def __init__(self):
+        self.relations = Counter()
+        self.classes = Counter()
+        self.n_entities = 0
+
+    def add(self, triplets, instanceOf):
+        """Count the (head, rel, tail) triplets and classes returned by `to_triplets` for one entity."""
+        self.relations.update([rel for _, rel, _ in triplets])
+        self.classes.update(instanceOf)
+        self.n_entities += 1
+
+    def update(self, other):
+        self.relations.update(other.relations)
+        self.classes.update(other.classes)
+        self.n_entities += other.n_entities
+
+    def to_dict(self):
+        return {'relations': dict(self.relations), 'classes': dict(self.classes), 'n_entities': self.n_entities}
+
+    @classmethod
+    def from_dict(cls, content):
+        stats = cls()
+        stats.relations.update(content['relations'])
+        stats.classes.update(content['classes'])
+        stats.n_entities = content['n_entities']
+        return stats
+
+    def frequent_relations(self, min_facts):
+        """Relations with at least `min_facts` facts, most frequent first. This can be given as `properties` to \
+        a new extraction to prune rare relations.
+
+        """
+        return [rel for rel, count in self.relations.most_common() if count >= min_facts]
+
+
+def write_stats_to_pickle(pickle_path, stats, n_pickle_dump, manifest=None, **shard):
+    file_name = 'stats_dump{}.pkl'.format(n_pickle_dump)
+    pickle.dump(stats.to_dict(), open(pickle_path + file_name, 'wb'))
+    if manifest is not None:
+        manifest.add(file_name, 'stats', stats.n_entities, **shard)
+    return DumpStats()
+
+
+def load_dump_stats(path_pickle):
+    """Sum of the `DumpStats` pickled in `path_pickle` (listed in its manifest if there is one), None if the \
+    pickles were written without statistics.
+
+    """
+    if os.path.exists(path_pickle + Manifest.file_name):
+        files = Manifest.load(path_pickle).files('stats')
+    else:
+        files = [path_pickle + name for name in sorted(os.listdir(path_pickle))
+                 if name.startswith('stats_dump') and name.endswith('.pkl')]
+    if len(files) == 0:
+        return None
+    stats = DumpStats()
+    for file in files:
+        with open(file, 'rb') as f:
+            stats.update(DumpStats.from_dict(pickle.load(f)))
+    return stats
+
+class ErrorLog:
+    """Streaming log of the lines of the dump which could not be processed. Each failure is written right away as \
+    a line `offset\tid\terror` where offset is the byte offset of the line in the decompressed dump (or its \
+    'block+offset' position for the range workers, see `wikidatasets.bz2blocks.iter_range_lines`), id the Wikidata \
+    ID of the entity (empty if it could not be read) and error the class name of the exception.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the log file. It is truncated if it already exists, so that it only holds the failures of the \
+        current run.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'w', encoding='utf-8')
+        self.n_errors = 0
+
+    def record(self, offset, line, error):
+        """Log the failure of `line` (raw string or parsed entity) read at `offset`, except for entities without \
+        claims and the closing bracket of the dump.
+
+        """
+        if isinstance(line, dict):
+            if 'claims' in line and len(line['claims']) == 0:
+                return
+            id_ = line.get('id', '')
+        else:
+            if line == ']':
+                return  # last line of the dump
+            id_ = peek_id(line) or ''
+        if isinstance(offset, tuple):
+            offset = format_position(offset)
+        self.file.write('{}\t{}\t{}\n'.format(offset, id_, type(error).__name__))
+        self.n_errors += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        if self.n_errors > 0:
+            print('{} lines failed, see {}'.format(self.n_errors, self.file_name))
+
+
+def read_error_logs(file_names):
+    """Reads error logs written by `ErrorLog`. A line logged several times (e.g. in the logs of two runs) is only \
+    returned once.
+
+    Returns
+    -------
+    errors: list
+        List of (offset, id, error) sorted by offset, offsets being either ints or (block, offset) positions.
+    """
+    errors = {}
+    for file_name in file_names:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            for row in f:
+                offset, id_, error = row.rstrip('\n').split('\t')
+                offset = int(offset) if offset.isdigit() else parse_position(offset)
+                errors.setdefault(offset, (offset, id_, error))
+    return sorted(errors.values(), key=lambda e: (isinstance(e[0], tuple), e[0]))
+
+
+def iter_failed_lines(dump_path, errors):
+    """Reads again the lines of the dump logged in `errors` (as returned by `read_error_logs`).
+
+    Only the (block, offset) positions logged by the range workers are read directly: the block is decompressed on \
+    its own (see `wikidatasets.bz2blocks.read_line`). The byte offsets logged by the serial and multiprocessing \
+    loops are offsets in the decompressed dump, which `bz2.BZ2File.seek` reaches by decompressing the dump from \
+    its start: the errors being sorted, the cost is one sequential decompression of the dump up to the last of \
+    these lines, i.e. up to a full pass on a complete dump.
+
+    Yields
+    ------
+    offset: int or tuple
+        Byte offset of the line in the decompressed dump, or its (block, offset) position.
+    line: str
+        The stripped line.
+    """
+    with bz2.open(dump_path, 'rb') as dump, open(dump_path, 'rb') as f:
+        for offset, _, _ in errors:
+            if isinstance(offset, tuple):
+                yield offset, read_line(f, offset).decode('utf-8').strip()
+                continue
+            dump.seek(offset)
+            yield offset, dump.readline().decode('utf-8').strip()
+
+
+# approximate CPython sizes in bytes, used to estimate the memory taken by the buffers of the dump loops
+STR_SIZE = 49  # empty str, plus one byte per ASCII character
+DICT_ENTRY_SIZE = 100  # amortized entry of a dict, with the table growth
+
+
+def sizeof_facts(triplets):
+    """Number of bytes taken by `triplets` once buffered in a `FactBuffer`."""
+    return len(triplets) * FactBuffer.itemsize
+
+
+def sizeof_label(id_, label):
+    """Approximate number of bytes taken by an entry of the labels dictionary, `label` being either a string or a \
+    dictionary of multi-lingual labels.
+
+    """
+    size = DICT_ENTRY_SIZE + STR_SIZE + len(id_)
+    if isinstance(label, dict):
+        size += DICT_ENTRY_SIZE
+        for lang, value in label.items():
+            size += DICT_ENTRY_SIZE + 2 * STR_SIZE + len(lang) + len(value)
+        return size
+    return size + STR_SIZE + len(label)
 
 
 def intersect(long_list, short_list):
@@ -177,42 +602,575 @@ def count_true_fails(fails):
     return true_fails
 
 
-def concatpkls(n_dump, path_pickle, labels=None):
-    df = pd.DataFrame(columns=['headEntity', 'relation', 'tailEntity'])
+def file_sha256(file_name):
+    import hashlib
+    sha = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class Manifest:
+    """Manifest of the shards (pickle files) written in a pickles/ directory, saved as manifest.json. Each shard \
+    records its file name, its kind ('facts', 'labels' or the name of a collector), the stage which wrote it \
+    ('query', 'expand' or 'replay'), the worker which wrote it and its index for this worker, the byte range \
+    [first_offset, end_offset) of the lines of the dump it was extracted from ('block+offset' positions for the \
+    range workers), its number of rows, its size in bytes and its sha256 checksum. Each run (one call to a dump \
+    processing function) is recorded with the kinds of shards it wrote and whether all its workers completed. A \
+    manifest only holds the shards of its own run until it is saved (see `save`).
+
+    Parameters
+    ----------
+    pickle_path: str
+        Path to the pickles/ directory.
+    file_name: str
+        Name of the file in `pickle_path`, manifest.json by default. Range workers save their own manifest under \
+        another name until they are merged.
+    """
+    file_name = 'manifest.json'
+
+    def __init__(self, pickle_path, file_name=None):
+        self.pickle_path = pickle_path
+        if file_name is not None:
+            self.file_name = file_name
+        self.runs = []
+        self.shards = []
+
+    @classmethod
+    def load(cls, pickle_path, file_name=None):
+        """Manifest of `pickle_path` if one was saved, an empty one otherwise."""
+        manifest = cls(pickle_path, file_name)
+        if os.path.exists(pickle_path + manifest.file_name):
+            with open(pickle_path + manifest.file_name, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+            manifest.runs, manifest.shards = content['runs'], content['shards']
+        return manifest
+
+    def add(self, file_name, kind, rows, stage='query', worker=0, index=None, first_offset=None, end_offset=None):
+        self.shards.append({'file': file_name, 'kind': kind, 'stage': stage, 'worker': worker, 'index': index,
+                            'first_offset': first_offset, 'end_offset': end_offset, 'rows': rows,
+                            'bytes': os.path.getsize(self.pickle_path + file_name),
+                            'sha256': file_sha256(self.pickle_path + file_name)})
+
+    def save(self, stage, dump_path, num_procs, complete):
+        """Saves the run and its shards on top of the manifest already saved, so that e.g. the labels and the facts \
+        can be collected by two runs in the same directory. The shards of a 'query' run replace all the saved \
+        shards of the same kinds, including the 'expand' and 'replay' shards derived from the previous extraction, \
+        and the saved runs which only wrote these kinds. The shards of the other stages are added to the saved \
+        ones. In both cases, saved shards whose file was rewritten are replaced.
+
+        """
+        kinds = sorted({shard['kind'] for shard in self.shards})
+        files = {shard['file'] for shard in self.shards}
+        saved = Manifest.load(self.pickle_path, self.file_name)
+        if stage == 'query':
+            saved.shards = [s for s in saved.shards if s['kind'] not in kinds]
+            saved.runs = [r for r in saved.runs if not set(r.get('kinds', [None])) <= set(kinds)]
+        self.shards = [s for s in saved.shards if s['file'] not in files] + self.shards
+        self.runs = saved.runs + [{'stage': stage, 'dump_path': dump_path, 'num_procs': num_procs,
+                                   'complete': complete, 'kinds': kinds}]
+        stages = {'query': 0, 'expand': 1, 'replay': 2}
+        self.shards.sort(key=lambda s: (stages.get(s['stage'], 3), s['kind'], s['worker'] or 0, s['index'] or 0))
+        with open(self.pickle_path + self.file_name, 'w', encoding='utf-8') as f:
+            json.dump({'runs': self.runs, 'shards': self.shards}, f, indent=1)
 
-    for nd in tqdm(range(n_dump)):
-        with open(path_pickle + 'dump{}.pkl'.format(nd + 1), 'rb') as f:
-            facts, fails = pickle.load(f)
-            true_fails = count_true_fails(fails)
-            if true_fails > 0:
-                print('{} true fails'.format(true_fails))
-        df = pd.concat([df, pd.DataFrame(facts, columns=['headEntity', 'relation', 'tailEntity'])])
-    df = df.drop_duplicates()
+    def files(self, kind='facts', verify=False):
+        """Paths to the shards of the given kind, in order, after checking that all runs completed and that the \
+        shards exist with the recorded size (and checksum if `verify`).
+
+        """
+        incomplete = [run for run in self.runs if not run['complete']]
+        if len(incomplete) > 0:
+            raise ManifestException('Incomplete run(s) in {}: {}'.format(self.pickle_path, incomplete))
+        files = []
+        for shard in self.shards:
+            if shard['kind'] != kind:
+                continue
+            file_name = self.pickle_path + shard['file']
+            if not os.path.exists(file_name) or os.path.getsize(file_name) != shard['bytes']:
+                raise ManifestException('Shard {} is missing or truncated.'.format(file_name))
+            if verify and file_sha256(file_name) != shard['sha256']:
+                raise ManifestException('Checksum of shard {} does not match.'.format(file_name))
+            files.append(file_name)
+        return files
+
+
+def get_fact_files(path_pickle, verify=False):
+    """Paths to the facts pickle files of `path_pickle`, read from its manifest or, for directories written before \
+    manifests, the dump{n}.pkl files.
+
+    """
+    if os.path.exists(path_pickle + Manifest.file_name):
+        return Manifest.load(path_pickle).files('facts', verify=verify)
+    n_files = len([name for name in os.listdir(path_pickle) if name[:4] == 'dump' and name[-4:] == '.pkl'])
+    return [path_pickle + 'dump{}.pkl'.format(nd + 1) for nd in range(n_files)]
+
+
+def concatpkls(n_dump, path_pickle, labels=None, files=None, num_procs=None):
+    """Concatenates the facts pickle files into one DataFrame of integer codes (see `encode_id`), or of labels if \
+    `labels` is given. The files are loaded by `num_procs` processes if given.
+
+    """
+    import pandas as pd
+    from tqdm import tqdm
+    if files is None:
+        files = [path_pickle + 'dump{}.pkl'.format(nd + 1) for nd in range(n_dump)]
+    if num_procs is None:
+        frames = [load_facts(file) for file in tqdm(files)]
+    else:
+        from multiprocessing import Pool
+        with Pool(num_procs) as pool:
+            frames = list(tqdm(pool.imap(load_facts, files), total=len(files)))
+    if len(frames) == 0:
+        frames = [pd.DataFrame(FactBuffer().to_dict())]
+    df = pd.concat(frames, ignore_index=True).drop_duplicates()
 
     if labels is not None:
-        df['headEntity'] = df['headEntity'].apply(relabel, args=(labels,))
-        df['relation'] = df['relation'].apply(relabel, args=(labels,))
-        df['tailEntity'] = df['tailEntity'].apply(relabel, args=(labels,))
+        if isinstance(labels, dict):
+            labels = build_label_store(labels)
+        for column, decode in [('headEntity', decode_ids), ('relation', decode_relations), ('tailEntity', decode_ids)]:
+            ids = pd.DataFrame({'wikidataID': decode(df[column])})
+            df[column] = relabel_frame(ids, labels)['label'].to_numpy()
 
     return df
 
 
-def write_csv(df, name):
-    with open(name, 'w', encoding='utf-8') as f:
-        f.write('headEntity\ttailEntity\trelation\n')
-        df.to_csv(f, sep='\t', header=False, index=False)
+def factorize_facts(df):
+    """Encode the facts of `df` (integer codes of Wikidata IDs, as returned by `concatpkls`) into consecutive \
+    integer IDs in a single pass over the columns. Heads get the first IDs in order of first appearance, tails which \
+    are never heads come next in order of first appearance.
 
+    Returns
+    -------
+    df: pandas.DataFrame
+        Encoded facts.
+    ents: list
+        Wikidata IDs of the core entities (heads), the index being the entity ID.
+    feats: list
+        Wikidata IDs of the attribute entities, the entity ID being len(ents) + index.
+    rels: list
+        Wikidata IDs of the relations, the index being the relation ID.
+    """
+    import pandas as pd
+    n_facts = len(df)
+    ent_codes, ent_uniques = pd.factorize(pd.concat([df['headEntity'], df['tailEntity']], ignore_index=True))
+    rel_codes, rel_uniques = pd.factorize(df['relation'])
+    n_core = int(ent_codes[:n_facts].max()) + 1 if n_facts > 0 else 0
+    ent_uniques = decode_ids(ent_uniques)
 
-def write_ent_dict(df, name):
-    with open(name, 'w', encoding='utf-8') as f:
-        f.write('entityID\twikidataID\tlabel\n')
-        df.to_csv(f, sep='\t', header=False, index=False)
+    df = pd.DataFrame({'headEntity': ent_codes[:n_facts].astype('int64'),
+                       'relation': rel_codes.astype('int64'),
+                       'tailEntity': ent_codes[n_facts:].astype('int64')})
+    return df, ent_uniques[:n_core], ent_uniques[n_core:], decode_relations(rel_uniques)
 
 
-def write_rel_dict(df, name):
-    with open(name, 'w', encoding='utf-8') as f:
-        f.write('relationID\twikidataID\tlabel\n')
-        df.to_csv(f, sep='\t', header=False, index=False)
+def factorize_shard(pickle_file):
+    """Map step of `concatpkls_parallel`: the facts of one pickle dump encoded with local IDs, as `factorize_facts` \
+    does for all the facts.
+
+    Returns
+    -------
+    ent_codes: numpy.array
+        Local IDs of the heads followed by the ones of the tails.
+    ent_uniques: numpy.array
+        Integer codes (see `encode_id`) of the entities, the index being the local ID. The `n_heads` first ones are \
+        the heads in order of first appearance, the other ones the tails which are not heads.
+    n_heads: int
+        Number of distinct heads.
+    rel_codes: numpy.array
+        Local IDs of the relations.
+    rel_uniques: numpy.array
+        Numbers of the relations, the index being the local ID.
+    """
+    import pandas as pd
+    df = load_facts(pickle_file)
+    ent_codes, ent_uniques = pd.factorize(pd.concat([df['headEntity'], df['tailEntity']], ignore_index=True))
+    rel_codes, rel_uniques = pd.factorize(df['relation'])
+    n_heads = int(ent_codes[:len(df)].max()) + 1 if len(df) > 0 else 0
+    return (ent_codes, np.asarray(ent_uniques, dtype=np.int64), n_heads,
+            rel_codes, np.asarray(rel_uniques, dtype=np.int64))
+
+
+def concatpkls_parallel(files, num_procs):
+    """Parallel counterpart of `concatpkls` followed by `factorize_facts`. Workers load each pickle dump and encode \
+    its facts with local IDs (see `factorize_shard`). The reduce step assigns the global IDs in the order of first \
+    appearance in the concatenated dumps, exactly as the serial path does, maps the local IDs of each dump to the \
+    global ones and drops the duplicated facts.
+
+    Parameters
+    ----------
+    files: list
+        Paths to the facts pickle files, in order.
+    num_procs: int
+        Number of worker processes.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+        Encoded and de-duplicated facts, identical to the ones of the serial path.
+    ents: list
+        Wikidata IDs of the core entities (heads), the index being the entity ID.
+    feats: list
+        Wikidata IDs of the attribute entities, the entity ID being len(ents) + index.
+    rels: list
+        Wikidata IDs of the relations, the index being the relation ID.
+    bounds: numpy.array
+        Rows of `df` at which the facts of each pickle file start, followed by len(df).
+    """
+    import pandas as pd
+    from multiprocessing import Pool
+
+    with Pool(num_procs) as pool:
+        shards = pool.map(factorize_shard, files)
+    empty = np.zeros(0, dtype=np.int64)
+
+    ents = pd.unique(np.concatenate([empty] + [uniques[:n_heads] for _, uniques, n_heads, _, _ in shards]))
+    tails = pd.unique(np.concatenate([empty] + [uniques[n_heads:] for _, uniques, n_heads, _, _ in shards]))
+    feats = tails[pd.Index(ents).get_indexer(tails) == -1]
+    rels = pd.unique(np.concatenate([empty] + [uniques for _, _, _, _, uniques in shards]))
+    ent_index, rel_index = pd.Index(np.concatenate([ents, feats])), pd.Index(rels)
+
+    heads, tails, relations, sizes = [empty], [empty], [empty], [0]
+    while len(shards) > 0:
+        ent_codes, ent_uniques, _, rel_codes, rel_uniques = shards.pop(0)
+        ent_ids = ent_index.get_indexer(ent_uniques).astype(np.int64)[ent_codes]
+        heads.append(ent_ids[:len(rel_codes)])
+        tails.append(ent_ids[len(rel_codes):])
+        relations.append(rel_index.get_indexer(rel_uniques).astype(np.int64)[rel_codes])
+        sizes.append(len(rel_codes))
+
+    df = pd.DataFrame({'headEntity': np.concatenate(heads), 'relation': np.concatenate(relations),
+                       'tailEntity': np.concatenate(tails)})
+    keep = ~df.duplicated().to_numpy()
+    bounds = np.concatenate([[0], np.cumsum(keep)])[np.cumsum(sizes)]
+    df = df[keep].reset_index(drop=True)
+    return df, decode_ids(ents), decode_ids(feats), decode_relations(rels), bounds
+
+
+def count_distinct(codes, size):
+    seen = np.zeros(size, dtype=bool)
+    seen[codes] = True
+    return int(np.count_nonzero(seen))
+
+
+def split_core_attributes(df, n_ents, n_rels):
+    """Classify encoded facts as core edges (tail is also a head) or attributes with a bitmap of the head entities.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Encoded facts.
+    n_ents: int
+        Total number of entities (core and attributes).
+    n_rels: int
+        Total number of relations.
+
+    Returns
+    -------
+    edges_mask: numpy.array
+        Boolean mask of the facts which are core edges.
+    is_head: numpy.array
+        Boolean mask of the entities which are heads of facts, i.e. the nodes.
+    counts: dict
+        Meta data of the dataset, as expected by `write_readme`.
+    """
+    heads = df['headEntity'].to_numpy()
+    tails = df['tailEntity'].to_numpy()
+    rels = df['relation'].to_numpy()
+
+    is_head = np.zeros(n_ents, dtype=bool)
+    is_head[heads] = True
+    edges_mask = is_head[tails]
+    attributes_mask = ~edges_mask
+
+    n_core_facts = int(np.count_nonzero(edges_mask))
+    counts = {'n_core_ents': count_distinct(heads[attributes_mask], n_ents),
+              'n_attrib_ents': count_distinct(tails[attributes_mask], n_ents),
+              'n_core_rels': count_distinct(rels[edges_mask], n_rels),
+              'n_attrib_rels': count_distinct(rels[attributes_mask], n_rels),
+              'n_core_facts': n_core_facts,
+              'n_attrib_facts': len(df) - n_core_facts}
+    return edges_mask, is_head, counts
+
+
+
+def dataset_stats(df, edges_mask, n_ents, rels):
+    """Statistics of encoded facts, one bincount per counter.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Encoded facts.
+    edges_mask: numpy.array
+        Boolean mask of the facts which are core edges, as returned by `split_core_attributes`.
+    n_ents: int
+        Total number of entities (core and attributes).
+    rels: list
+        Wikidata IDs of the relations, the index being the relation ID.
+
+    Returns
+    -------
+    stats: dict
+        Dictionary of columns (numpy arrays) for the relations (relationID, n_facts, n_core_facts), the entities \
+        (entityID, out_degree, in_degree) and the classes, i.e. the tails of P31 facts (entityID, n_instances).
+    """
+    heads = df['headEntity'].to_numpy()
+    tails = df['tailEntity'].to_numpy()
+    relations = df['relation'].to_numpy()
+    n_rels = len(rels)
+
+    instances = np.zeros(n_ents, dtype=np.int64)
+    if 'P31' in rels:
+        instances = np.bincount(tails[relations == rels.index('P31')], minlength=n_ents)
+    classes = np.flatnonzero(instances)
+    return {'relations': {'relationID': np.arange(n_rels),
+                          'n_facts': np.bincount(relations, minlength=n_rels),
+                          'n_core_facts': np.bincount(relations[edges_mask], minlength=n_rels)},
+            'entities': {'entityID': np.arange(n_ents),
+                         'out_degree': np.bincount(heads, minlength=n_ents),
+                         'in_degree': np.bincount(tails, minlength=n_ents)},
+            'classes': {'entityID': classes, 'n_instances': instances[classes]}}
+
+
+def write_stats(name, stats, dump_stats=None):
+    """Pickle the statistics returned by `dataset_stats`, along with the `DumpStats` of the extraction if given."""
+    stats = dict(stats, dump=None if dump_stats is None else dump_stats.to_dict())
+    with open(name, 'wb') as f:
+        pickle.dump(stats, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_stats(path):
+    """Loads the stats.pkl file written by `build_dataset`.
+
+    Parameters
+    ----------
+    path: str
+        Path to the directory of the dataset.
+
+    Returns
+    -------
+    stats: dict
+        DataFrames 'relations' (relationID, n_facts, n_core_facts), 'entities' (entityID, out_degree, in_degree) \
+        and 'classes' (entityID, n_instances), the IDs being the ones of the relations.tsv and entities.tsv files, \
+        and the `DumpStats` of the extraction as 'dump' (None if the pickles were written without statistics).
+    """
+    import pandas as pd
+    if path[-1] != '/':
+        path = path + '/'
+    with open(path + 'stats.pkl', 'rb') as f:
+        stats = pickle.load(f)
+    return {'relations': pd.DataFrame(stats['relations']),
+            'entities': pd.DataFrame(stats['entities']),
+            'classes': pd.DataFrame(stats['classes']),
+            'dump': None if stats['dump'] is None else DumpStats.from_dict(stats['dump'])}
+
+def unique_in_order(values):
+    """Unique values of an iterable in order of first appearance."""
+    return list(dict.fromkeys(values))
+
+
+def load_facts(pickle_file):
+    import pandas as pd
+    with open(pickle_file, 'rb') as f:
+        facts = pickle.load(f)
+    if isinstance(facts, dict):
+        return pd.DataFrame(facts, columns=['headEntity', 'relation', 'tailEntity'])
+
+    # pickles written before the fact buffers hold a list of triplets of Wikidata IDs
+    if isinstance(facts, tuple):
+        # pickles written before the error logs also contain the failed lines
+        facts, fails = facts
+        true_fails = count_true_fails(fails)
+        if true_fails > 0:
+            print('{} true fails'.format(true_fails))
+    df = pd.DataFrame(facts, columns=['headEntity', 'relation', 'tailEntity'])
+    return pd.DataFrame({'headEntity': encode_id_column(df['headEntity']),
+                         'relation': -encode_id_column(df['relation']),
+                         'tailEntity': encode_id_column(df['tailEntity'])})
+
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+WRITE_BUFFER_SIZE = 1 << 24
+WRITE_CHUNK_ROWS = 1 << 20
+
+
+def open_output(name, compression=None):
+    """Open `name` for binary writing with a large buffer, compressed with gzip or zstd if asked.
+
+    Returns
+    -------
+    f: file object
+        Binary file object to write to.
+    name: str
+        Name of the written file, with the suffix of the compression (.gz or .zst).
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError('Unknown compression {}, should be one of {}.'.format(
+            compression, list(COMPRESSION_SUFFIXES.keys())))
+    name = name + COMPRESSION_SUFFIXES[compression]
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(name, 'wb', compresslevel=6), name
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd compression requires the zstandard package.')
+        return zstandard.ZstdCompressor().stream_writer(open(name, 'wb')), name
+    return open(name, 'wb', buffering=WRITE_BUFFER_SIZE), name
+
+
+def format_int_rows(columns):
+    """Format columns of non-negative integers as tab separated lines, in bulk with numpy. Digits of all rows are \
+    laid out in a byte matrix (one block of max-width digits and one separator per column), leading zeros are then \
+    masked out.
+
+    Parameters
+    ----------
+    columns: list
+        List of numpy arrays of integers of the same length.
+
+    Returns
+    -------
+    text: bytes
+        The formatted lines, each ended with a newline.
+    """
+    columns = [np.asarray(c, dtype=np.int64) for c in columns]
+    n_rows = len(columns[0])
+    if n_rows == 0:
+        return b''
+    if min(int(c.min()) for c in columns) < 0:
+        line = '\t'.join(['%d'] * len(columns)) + '\n'
+        return ''.join([line % row for row in zip(*[c.tolist() for c in columns])]).encode('utf-8')
+
+    blocks, masks = [], []
+    for i, col in enumerate(columns):
+        width = len(str(int(col.max())))
+        digits = np.empty((n_rows, width + 1), dtype=np.uint8)
+        mask = np.ones((n_rows, width + 1), dtype=bool)
+        values = col.copy()
+        for k in range(width - 1, -1, -1):
+            values, digit = np.divmod(values, 10)
+            digits[:, k] = digit + 48
+        for k in range(width - 1):
+            mask[:, k] = col >= 10 ** (width - 1 - k)
+        digits[:, width] = ord('\t') if i < len(columns) - 1 else ord('\n')
+        blocks.append(digits)
+        masks.append(mask)
+    return np.hstack(blocks)[np.hstack(masks)].tobytes()
+
+
+def format_str_rows(df):
+    """Format a DataFrame as tab separated lines, quoting exactly like `DataFrame.to_csv`."""
+    import csv
+    import io
+    buffer = io.StringIO()
+    columns = [df[c] for c in df.columns]
+    rows = zip(*[c.astype(object).where(c.notna(), None).tolist() if c.hasnans else c.tolist() for c in columns])
+    csv.writer(buffer, delimiter='\t', lineterminator='\n').writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def format_tsv(df):
+    return format_int_rows([df[c].to_numpy() for c in df.columns])
+
+
+_frame, _formatter = None, None
+
+
+def init_tsv_writer(df, formatter):
+    global _frame, _formatter
+    _frame, _formatter = df, formatter
+
+
+def format_frame_range(rows):
+    """Format the rows [start, end) of the DataFrame given to `init_tsv_writer`."""
+    start, end = rows
+    return _formatter(_frame.iloc[start:end])
+
+
+def write_tsv(df, name, header, formatter, num_procs=None, compression=None):
+    """Write `df` with the header line `header` by chunks of WRITE_CHUNK_ROWS rows formatted by `formatter`. Chunks \
+    are formatted by `num_procs` processes if given, and written in order. The processes get `df` once when they \
+    start (without copy where processes are forked) and then only the range of rows of each chunk.
+
+    Returns
+    -------
+    name: str
+        Name of the written file.
+    """
+    ranges = [(i, min(i + WRITE_CHUNK_ROWS, len(df))) for i in range(0, len(df), WRITE_CHUNK_ROWS)]
+    f, name = open_output(name, compression)
+    with f:
+        f.write(header.encode('utf-8'))
+        if num_procs is None or len(ranges) <= 1:
+            for start, end in ranges:
+                f.write(formatter(df.iloc[start:end]))
+        else:
+            from multiprocessing import Pool
+            with Pool(num_procs, initializer=init_tsv_writer, initargs=(df, formatter)) as pool:
+                for text in pool.imap(format_frame_range, ranges):
+                    f.write(text)
+    return name
+
+
+def write_csv(df, name, num_procs=None, compression=None):
+    return write_tsv(df[['headEntity', 'tailEntity', 'relation']], name, 'headEntity\ttailEntity\trelation\n',
+                     format_tsv, num_procs=num_procs, compression=compression)
+
+
+def write_ent_dict(df, name, num_procs=None, compression=None):
+    return write_tsv(df, name, '\t'.join(df.columns) + '\n', format_str_rows, num_procs=num_procs,
+                     compression=compression)
+
+
+def write_rel_dict(df, name, num_procs=None, compression=None):
+    return write_tsv(df, name, '\t'.join(df.columns) + '\n', format_str_rows, num_procs=num_procs,
+                     compression=compression)
+
+
+_facts = None
+
+
+def init_fact_writer(heads, tails, relations, edges_mask):
+    global _facts
+    _facts = heads, tails, relations, edges_mask
+
+
+def format_fact_range(rows):
+    """Format the edges and the attributes among the rows [start, end) of the facts given to `init_fact_writer`."""
+    start, end = rows
+    heads, tails, relations, edges_mask = (column[start:end] for column in _facts)
+    return (format_int_rows([heads[edges_mask], tails[edges_mask], relations[edges_mask]]),
+            format_int_rows([heads[~edges_mask], tails[~edges_mask], relations[~edges_mask]]))
+
+
+def write_facts_parallel(df, edges_mask, bounds, path, num_procs, compression=None):
+    """Write edges.tsv and attributes.tsv in `path`, identical to the files of `write_csv`. Each worker formats the \
+    facts of one pickle file (delimited by `bounds`, as returned by `concatpkls_parallel`), by ranges of at most \
+    WRITE_CHUNK_ROWS rows, and the texts are written in order. The workers get the facts once when they start \
+    (without copy where processes are forked) rather than with each range.
+
+    Returns
+    -------
+    names: tuple
+        Names of the written edges and attributes files.
+    """
+    from multiprocessing import Pool
+    ranges = [(start, min(start + WRITE_CHUNK_ROWS, end)) for first, end in zip(bounds[:-1], bounds[1:])
+              for start in range(first, end, WRITE_CHUNK_ROWS)]
+    header = 'headEntity\ttailEntity\trelation\n'.encode('utf-8')
+    columns = (df['headEntity'].to_numpy(), df['tailEntity'].to_numpy(), df['relation'].to_numpy(), edges_mask)
+    edges_file, edges_name = open_output(path + 'edges.tsv', compression)
+    attributes_file, attributes_name = open_output(path + 'attributes.tsv', compression)
+    with edges_file, attributes_file, Pool(num_procs, initializer=init_fact_writer, initargs=columns) as pool:
+        edges_file.write(header)
+        attributes_file.write(header)
+        for edges, attributes in pool.imap(format_fact_range, ranges):
+            edges_file.write(edges)
+            attributes_file.write(attributes)
+    return edges_name, attributes_name
 
 
 def write_readme(name, n_core_ents, n_attrib_ents,
@@ -233,7 +1191,7 @@ def write_readme(name, n_core_ents, n_attrib_ents,
         f.write("Find more details about this dataset at https://arxiv.org/abs/1906.04536.")
 
 
-def load_data_labels(path, attributes=False, return_dicts=False):
+def load_data_labels(path, attributes=False, return_dicts=False, compression=None):
     """This function loads the edges and attributes files into Pandas dataframes and merges the labels of entities and \
     relations to get.
 
@@ -245,6 +1203,8 @@ def load_data_labels(path, attributes=False, return_dicts=False):
         Boolean indicating if we should read the attributes files. If False, then the edges file is read.
     return_dicts: bool
         Boolean indicating if the entities and relations labels dictionaries should be returned.
+    compression: str
+        Compression used when building the dataset (None, 'gzip' or 'zstd').
 
     Returns
     -------
@@ -255,14 +1215,16 @@ def load_data_labels(path, attributes=False, return_dicts=False):
     relations: pandas.DataFrame
         DataFrame containing the list of all relations and wikidata IDs and labels.
     """
+    import pandas as pd
 
+    suffix = COMPRESSION_SUFFIXES[compression]
     if attributes:
-        df = pd.read_csv(path + 'attributes.tsv', sep='\t')
+        df = pd.read_csv(path + 'attributes.tsv' + suffix, sep='\t')
     else:
-        df = pd.read_csv(path + 'edges.tsv', sep='\t')
+        df = pd.read_csv(path + 'edges.tsv' + suffix, sep='\t')
 
-    entities = pd.read_csv(path + 'entities.tsv', sep='\t')
-    relations = pd.read_csv(path + 'relations.tsv', sep='\t')
+    entities = pd.read_csv(path + 'entities.tsv' + suffix, sep='\t')
+    relations = pd.read_csv(path + 'relations.tsv' + suffix, sep='\t')
 
     df = pd.merge(left=df, right=entities[['entityID', 'label']], left_on='headEntity',
                   right_on='entityID')